@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmarks for flattened, chained and adaptive layouts.
+
+Each workload is run at several depths, on each layout. Compare results of a
+workload to find the crossover points: chained layout wins write-heavy
+workloads with frequent resets, flattened layout wins read-heavy workloads,
+more and more as depth increases. Adaptive layout is meant to win workloads
+which alternate between both kinds of phases.
+
+"""
+import benchmark
+
+from wardrobe import AdaptiveStackedDict, ChainedStackedDict, StackedDict
+
+
+class Workload(object):
+    """Mixin for benchmarks of a workload at some depth."""
+    #: Number of layers below the one where the workload runs.
+    depth = 0
+
+    #: Number of keys in the base layer.
+    size = 1000
+
+    def setUp(self):
+        """Prepare data outside benchmarks."""
+        self.key_range = range(0, self.size)
+
+    def _stackeddict(self, cls):
+        """Return instance of cls with base and layers."""
+        s = cls(dict.fromkeys(self.key_range, 'Hello world!'))
+        for layer_num in range(0, self.depth):
+            s.commit()[layer_num] = layer_num
+        return s
+
+    def _run(self, stackeddict):
+        raise NotImplementedError()
+
+    def test_flattened(self):
+        """Benchmark :py:class:`wardrobe.stackeddict.StackedDict`."""
+        self._run(self._stackeddict(StackedDict))
+
+    def test_chained(self):
+        """Benchmark :py:class:`wardrobe.chained.ChainedStackedDict`."""
+        self._run(self._stackeddict(ChainedStackedDict))
+
+    def test_adaptive(self):
+        """Benchmark :py:class:`wardrobe.adaptive.AdaptiveStackedDict`."""
+        self._run(self._stackeddict(AdaptiveStackedDict))
+
+
+class ReadWorkload(Workload):
+    """Reads of all keys, 10 times."""
+    def _run(self, stackeddict):
+        for iteration in range(0, 10):
+            for key in self.key_range:
+                stackeddict[key]
+
+
+class WriteResetWorkload(Workload):
+    """Layers of 10 writes, dropped by reset."""
+    def _run(self, stackeddict):
+        for iteration in range(0, 1000):
+            stackeddict.commit()
+            for key in range(0, 10):
+                stackeddict[key] = iteration
+            stackeddict.reset()
+
+
+class MixedWorkload(Workload):
+    """Layers of 10 writes and 10 reads, dropped by reset."""
+    def _run(self, stackeddict):
+        for iteration in range(0, 1000):
+            stackeddict.commit()
+            for key in range(0, 10):
+                stackeddict[key] = iteration
+                stackeddict[key + 10]
+            stackeddict.reset()
+
+
+class AlternatingWorkload(Workload):
+    """Read-heavy phases alternating with write/reset-heavy phases."""
+    def _run(self, stackeddict):
+        for phase in range(0, 5):
+            for iteration in range(0, 3):
+                for key in self.key_range:
+                    stackeddict[key]
+            for iteration in range(0, 300):
+                stackeddict.commit()
+                for key in range(0, 10):
+                    stackeddict[key] = iteration
+                stackeddict.reset()
+
+
+class BenchmarkRead0(ReadWorkload, benchmark.Benchmark):
+    depth = 0
+
+
+class BenchmarkRead4(ReadWorkload, benchmark.Benchmark):
+    depth = 4
+
+
+class BenchmarkRead16(ReadWorkload, benchmark.Benchmark):
+    depth = 16
+
+
+class BenchmarkWriteReset0(WriteResetWorkload, benchmark.Benchmark):
+    depth = 0
+
+
+class BenchmarkWriteReset4(WriteResetWorkload, benchmark.Benchmark):
+    depth = 4
+
+
+class BenchmarkWriteReset16(WriteResetWorkload, benchmark.Benchmark):
+    depth = 16
+
+
+class BenchmarkMixed0(MixedWorkload, benchmark.Benchmark):
+    depth = 0
+
+
+class BenchmarkMixed4(MixedWorkload, benchmark.Benchmark):
+    depth = 4
+
+
+class BenchmarkMixed16(MixedWorkload, benchmark.Benchmark):
+    depth = 16
+
+
+class BenchmarkAlternating0(AlternatingWorkload, benchmark.Benchmark):
+    depth = 0
+
+
+class BenchmarkAlternating4(AlternatingWorkload, benchmark.Benchmark):
+    depth = 4
+
+
+class BenchmarkAlternating16(AlternatingWorkload, benchmark.Benchmark):
+    depth = 16
+
+
+if __name__ == '__main__':
+    benchmark.main(format="markdown", numberFormat="%.4g", each=10,
+                   sort_by='name')
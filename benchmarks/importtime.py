@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmarks for import time of wardrobe package.
+
+Each benchmark starts a new Python interpreter, so that modules are really
+imported. Compare with ``test_python``, which only starts the interpreter.
+
+"""
+from os.path import abspath, dirname
+from subprocess import check_call
+import sys
+
+import benchmark
+
+
+project_dir = dirname(dirname(abspath(__file__)))
+
+
+def run_python(code):
+    """Run code in a new Python interpreter."""
+    check_call([sys.executable, '-c', 'import sys; sys.path.insert(0, %r); %s'
+                % (project_dir, code)])
+
+
+class BenchmarkImport(benchmark.Benchmark):
+    """Benchmarks for imports of :py:mod:`wardrobe`."""
+    def test_python(self):
+        """Benchmark interpreter startup, for comparison purpose."""
+        run_python('pass')
+
+    def test_import_wardrobe(self):
+        """Benchmark ``import wardrobe``."""
+        run_python('import wardrobe')
+
+    def test_import_stackeddict(self):
+        """Benchmark ``from wardrobe import StackedDict``."""
+        run_python('from wardrobe import StackedDict')
+
+    def test_import_all(self):
+        """Benchmark ``from wardrobe import *``, which loads all variants."""
+        run_python('from wardrobe import *')
+
+
+if __name__ == '__main__':
+    benchmark.main(format="markdown", numberFormat="%.4g", each=20,
+                   sort_by='name')
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""Benchmarks for wardrobe.schemadict module."""
+import benchmark
+
+from wardrobe import SchemaStackedDict, StackedDict
+
+
+class BenchmarkSchemaStackedDict(benchmark.Benchmark):
+    """Benchmarks for :py:class:`wardrobe.schemadict.SchemaStackedDict`."""
+    def setUp(self):
+        """Prepare data outside benchmarks."""
+        key_count = 300
+        layer_count = 10
+        self.keys = ['key%d' % num for num in range(0, key_count)]
+        self.layers = []
+        for layer_num in range(0, layer_count):
+            layer = dict.fromkeys(self.keys[layer_num::layer_count + 1],
+                                  layer_num)
+            self.layers.append(layer)
+        self.initial = dict.fromkeys(self.keys, 'Hello world!')
+
+    def _commit_reset(self, s):
+        for layer in self.layers:
+            s.commit().update(layer)
+        for layer in self.layers:
+            s.reset()
+
+    def test_commit_reset(self):
+        """Benchmark :py:meth:`SchemaStackedDict.commit` and
+        :py:meth:`SchemaStackedDict.reset`."""
+        self._commit_reset(SchemaStackedDict(self.keys, self.initial))
+
+    def test_stackeddict_commit_reset(self):
+        """Benchmark StackedDict's commit() and reset() for comparison
+        purpose."""
+        self._commit_reset(StackedDict(dict(self.initial)))
+
+
+if __name__ == '__main__':
+    benchmark.main(format="markdown", numberFormat="%.4g", each=100,
+                   sort_by='name')
@@ -45,6 +45,17 @@ class BenchmarkStackedDict(benchmark.Benchmark):
         """Benchmark standard dict's __setitem__ for comparison purpose."""
         self._dict_setitem()
 
+    def test_from_layers(self):
+        """Benchmark :py:meth:`StackedDict.from_layers`."""
+        StackedDict.from_layers(self.layers)
+
+    def test_commit_update(self):
+        """Benchmark commit() then update() for each layer, for comparison
+        purpose."""
+        s = StackedDict(dict(self.layers[0]))
+        for layer in self.layers[1:]:
+            s.commit().update(layer)
+
     def test_getitem(self):
         """Benckmark :py:meth:`StackedDict.__getitem__`."""
         for key in self.key_range:
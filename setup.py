@@ -2,6 +2,7 @@
 """Python packaging."""
 import os
 from setuptools import setup
+from setuptools.command.build_py import build_py
 
 
 def read_relative_file(filename):
@@ -16,6 +17,18 @@ README = read_relative_file('README')
 VERSION = read_relative_file(os.path.join(NAME, 'version.txt')).strip()
 
 
+class build_py_with_version(build_py):
+    """Write version into built package, so that importing it doesn't read
+    version.txt."""
+    def run(self):
+        build_py.run(self)
+        if not self.dry_run:
+            version_module = os.path.join(self.build_lib, NAME, '_version.py')
+            with open(version_module, 'w') as f:
+                f.write("__version__ = %r\n" % VERSION)
+            self.byte_compile([version_module])
+
+
 setup(name=NAME,
       version=VERSION,
       description='Stack-based datastructures: StackedDict.',
@@ -33,4 +46,6 @@ setup(name=NAME,
       include_package_data=True,
       zip_safe=False,
       install_requires=['setuptools'],
+      extras_require={'numpy': ['numpy']},
+      cmdclass={'build_py': build_py_with_version},
       )
@@ -12,13 +12,112 @@ Or:
 
 See :py:class:`wardrobe.stackeddict.StackedDict` for details.
 
+Variants are also available at package level:
+
+* :py:class:`wardrobe.schemadict.SchemaStackedDict`, restricted to a fixed
+  set of keys.
+* :py:class:`wardrobe.copyonwrite.CopyOnWriteStackedDict`, which also rolls
+  back in-place mutations of values.
+* :py:class:`wardrobe.branching.BranchingStackedDict`, where layers form a
+  tree of named branches.
+* :py:class:`wardrobe.history.HistoryStackedDict`, which reads values as they
+  were in former layers and tells which layer defines each key.
+* :py:class:`wardrobe.bounded.BoundedStackedDict`, which squashes its oldest
+  layers when history gets too long.
+* :py:class:`wardrobe.observable.ObservableStackedDict`, which notifies
+  changes of its items.
+* :py:class:`wardrobe.fingerprint.FingerprintStackedDict`, which maintains a
+  fingerprint of its contents.
+* :py:class:`wardrobe.sortedkeys.SortedStackedDict`, which keeps its keys
+  sorted and provides namespace views.
+* :py:class:`wardrobe.lazy.LazyStackedDict`, which evaluates lazy values on
+  first read.
+* :py:class:`wardrobe.chained.ChainedStackedDict`, which stores one dict per
+  layer.
+* :py:class:`wardrobe.adaptive.AdaptiveStackedDict`, which switches between
+  flattened and chained layouts according to its workload.
+* :py:class:`wardrobe.tiered.TieredStackedDict`, which spills old layers to a
+  compressed file.
+* :py:class:`wardrobe.release.DeferredReleaseStackedDict`, which frees
+  values discarded by reset() in a background thread.
+* :py:class:`wardrobe.lru.LRUStackedDict`, whose base layer is a cache
+  with bounded capacity.
+* :py:class:`wardrobe.rcu.RCUStackedDict`, which readers share with a
+  writer thread without locks.
+* :py:class:`wardrobe.sharded.ShardedStackedDict`, which spreads its keys
+  across worker processes.
+* :py:class:`wardrobe.remote.RemoteStackedDict`, whose base layer is stored
+  in a remote key-value store.
+* :py:class:`wardrobe.transaction.TransactionalStackedDict`, which threads
+  update through optimistic transactions.
+
+:py:class:`wardrobe.stackedarray.StackedArray` requires numpy, hence it is
+not imported at package level.
+
+Classes are imported from their module on first access, so that importing
+wardrobe only loads the variants which are used.
+
 """
+from importlib import import_module
 from os.path import abspath, dirname, join
+import sys
+from types import ModuleType
+
+
+#: Module of each class available at package level.
+_lazy_classes = {
+    'AdaptiveStackedDict': 'wardrobe.adaptive',
+    'BoundedStackedDict': 'wardrobe.bounded',
+    'BranchingStackedDict': 'wardrobe.branching',
+    'ChainedStackedDict': 'wardrobe.chained',
+    'CopyOnWriteStackedDict': 'wardrobe.copyonwrite',
+    'DeferredReleaseStackedDict': 'wardrobe.release',
+    'FingerprintStackedDict': 'wardrobe.fingerprint',
+    'HistoryStackedDict': 'wardrobe.history',
+    'LazyStackedDict': 'wardrobe.lazy',
+    'LRUStackedDict': 'wardrobe.lru',
+    'ObservableStackedDict': 'wardrobe.observable',
+    'RCUStackedDict': 'wardrobe.rcu',
+    'RemoteStackedDict': 'wardrobe.remote',
+    'SchemaStackedDict': 'wardrobe.schemadict',
+    'ShardedStackedDict': 'wardrobe.sharded',
+    'SortedStackedDict': 'wardrobe.sortedkeys',
+    'StackedDict': 'wardrobe.stackeddict',
+    'TieredStackedDict': 'wardrobe.tiered',
+    'TransactionalStackedDict': 'wardrobe.transaction',
+}
 
-from wardrobe.stackeddict import StackedDict 
+__all__ = sorted(_lazy_classes)
 
 
 #: Implement :pep:`396`
 package_dir = dirname(abspath(__file__))
 version_file = join(package_dir, 'version.txt')
-__version__ = open(version_file).read().strip()
+try:
+    # Written by setup.py at build time.
+    from wardrobe._version import __version__
+except ImportError:  # Source checkout.
+    __version__ = open(version_file).read().strip()
+
+
+class _LazyModule(ModuleType):
+    """Package module which imports classes on first access."""
+    def __getattr__(self, name):
+        try:
+            module_name = _lazy_classes[name]
+        except KeyError:
+            raise AttributeError(name)
+        value = getattr(import_module(module_name), name)
+        setattr(self, name, value)
+        return value
+
+    def __dir__(self):
+        return sorted(set(self.__dict__).union(_lazy_classes))
+
+
+_module = _LazyModule(__name__)
+_module.__dict__.update(globals())
+# Keep a reference to the original module: in Python 2, the globals of a
+# module are cleared when it is garbage collected.
+_module._original_module = sys.modules[__name__]
+sys.modules[__name__] = _module
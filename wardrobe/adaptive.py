@@ -0,0 +1,274 @@
+"""StackedDict variant which switches layout according to its workload."""
+from wardrobe.chained import chain, ChainedStackedDict, flatten
+from wardrobe.stackeddict import _DELETED, NoRevisionException, StackedDict
+
+
+#: Marker for keys missing from a layer.
+_MISSING = object()
+
+_flattened_commit = StackedDict.__dict__['commit']
+_flattened_reset = StackedDict.__dict__['reset']
+
+
+def _layout_method(name):
+    """Return method which calls the implementation of name of the current
+    layout, i.e. of :py:class:`~wardrobe.stackeddict.StackedDict` or of
+    :py:class:`~wardrobe.chained.ChainedStackedDict`."""
+    flattened = StackedDict.__dict__[name]
+    chained = ChainedStackedDict.__dict__[name]
+
+    def method(self, *args):
+        if self._layers is None:
+            return flattened(self, *args)
+        return chained(self, *args)
+    method.__name__ = name
+    return method
+
+
+class AdaptiveStackedDict(StackedDict):
+    """StackedDict which switches between the flattened layout of
+    :py:class:`~wardrobe.stackeddict.StackedDict` and the chained layout of
+    :py:class:`~wardrobe.chained.ChainedStackedDict`.
+
+    Reads are counted, and so are commits, resets and entries of layers
+    dropped by resets, which stand for writes. Every :py:attr:`window`
+    operations, the cost of the last window is estimated for both layouts.
+    Layout is switched if the other one is :py:attr:`switch_ratio` times
+    cheaper, which avoids switching back and forth on mixed workloads.
+    In chained layout, :py:attr:`read_streak` reads in a row also switch to
+    flattened layout. Switching costs the total size of the layers.
+
+    >>> from wardrobe import AdaptiveStackedDict
+    >>> class ShortWindowStackedDict(AdaptiveStackedDict):
+    ...     window = 100
+    ...     read_streak = 100
+    >>> s = ShortWindowStackedDict(a=0)
+    >>> s.mode
+    'flattened'
+    >>> for value in range(100):  # Write-heavy.
+    ...     s.commit()['a'] = value
+    ...     s['b'] = value
+    ...     silent = s.reset()
+    >>> s.mode
+    'chained'
+    >>> for value in range(100):  # Read-heavy.
+    ...     silent = s['a']
+    >>> s.mode
+    'flattened'
+    >>> dict(s)
+    {'a': 0}
+
+    The layout is stored in the instance, not in its class, so that tools
+    which switch the class of instances, such as
+    :py:class:`~wardrobe.profiler.KeyProfiler`, work across layout changes.
+
+    >>> from wardrobe.profiler import KeyProfiler
+    >>> profiler = KeyProfiler(s)
+    >>> for value in range(100):
+    ...     s.commit()['a'] = value
+    ...     silent = s.reset()
+    >>> s.mode
+    'chained'
+    >>> profiler.close()
+    >>> dict(s)
+    {'a': 0}
+
+    Layer operations are traced in both layouts.
+
+    >>> class SpanRecorder(object):
+    ...     clock = staticmethod(lambda: 0)
+    ...     def __init__(self):
+    ...         self.spans = []
+    ...     def span(self, name, start, depth, entries):
+    ...         self.spans.append((name, depth, entries))
+    >>> s.tracer = SpanRecorder()
+    >>> s.commit()['b'] = 1
+    >>> silent = s.reset()
+    >>> s.mode, s.tracer.spans
+    ('chained', [('commit', 1, 0), ('reset', 0, 1)])
+
+    """
+    #: Number of operations between evaluations of the layout. Changes take
+    #: effect at the end of the current window.
+    window = 500
+
+    #: Number of consecutive reads, without commit nor reset, after which
+    #: chained layout switches to flattened layout.
+    read_streak = 100
+
+    #: How many times cheaper the other layout must be to switch.
+    switch_ratio = 1.5
+
+    def __init__(self, initial=None, **kwargs):
+        super(AdaptiveStackedDict, self).__init__(initial, **kwargs)
+        self._layers = None  # Layers of chained layout, base first.
+        self._clear_counts()
+
+    def _clear_counts(self):
+        self._reads = 0  # Reads since last commit or reset.
+        self._countdown = self.window  # Operations left in window.
+        # Estimated costs of window, in units of one dict lookup.
+        self._flattened_cost = 0
+        self._chained_cost = 0
+
+    @property
+    def mode(self):
+        """Current layout: 'flattened' or 'chained'."""
+        if self._layers is None:
+            return 'flattened'
+        return 'chained'
+
+    def _count(self, depth, restored):
+        """Count a commit or reset at depth, which drops a layer of
+        ``restored`` entries, and the reads since the previous commit or
+        reset. Switch layout at the end of a window.
+
+        Costs are estimated in units of one dict lookup. Flattened reads are
+        one lookup, whereas writes record backups and resets restore them.
+        Chained reads look layers up, from the current one down, whereas
+        writes and resets cost constant time. Writes are estimated by the
+        number of entries of layers dropped by resets. Weights were measured
+        with ``benchmarks/adaptive.py``.
+
+        """
+        reads = self._reads
+        self._reads = 0
+        self._flattened_cost += reads + 4 * restored + 2
+        self._chained_cost += reads * (3 + depth) + restored + 2
+        self._countdown -= reads + restored + 1
+        if self._countdown <= 0:
+            flattened, chained = self._flattened_cost, self._chained_cost
+            self._clear_counts()
+            if self._layers is None:
+                if chained * self.switch_ratio < flattened:
+                    self._to_chained()
+            elif flattened * self.switch_ratio < chained:
+                self._to_flattened()
+
+    def _to_chained(self):
+        self._layers = chain(self._dict, self._created, self._overriden)
+        del self._dict, self._created, self._overriden
+
+    def _to_flattened(self):
+        self._dict, self._created, self._overriden = flatten(self._layers)
+        self._layers = None
+
+    # Helpers of chained layout.
+    _find = ChainedStackedDict.__dict__['_find']
+    _visible_items = ChainedStackedDict.__dict__['_visible_items']
+    _delete = ChainedStackedDict.__dict__['_delete']
+
+    def __getitem__(self, key):
+        self._reads += 1
+        layers = self._layers
+        if layers is None:
+            return self._dict[key]
+        if self._reads >= self.read_streak:
+            self._clear_counts()
+            self._to_flattened()
+            return self._dict[key]
+        for layer in reversed(layers):
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                if value is _DELETED:
+                    raise KeyError(key)
+                return value
+        raise KeyError(key)
+
+    def has_key(self, key):
+        self._reads += 1
+        if self._layers is None:
+            return key in self._dict
+        return self._find(key, self._layers) is not _DELETED
+
+    def __setitem__(self, key, value):
+        if self._redo:
+            self._redo = []
+        layers = self._layers
+        if layers is not None:
+            layers[-1][key] = value
+            return
+        values = self._dict
+        if self._overriden:  # We may have to backup value.
+            if key not in values:
+                self._created[0].add(key)
+            elif key not in self._created[0]:
+                overriden = self._overriden[0]
+                if key not in overriden:
+                    overriden[key] = values[key]
+        values[key] = value
+
+    def commit(self):
+        layers = self._layers
+        if layers is None:
+            self._count(len(self._created), 0)
+        else:
+            self._count(len(layers) - 1, 0)
+        layers = self._layers  # Layout may have changed.
+        if layers is None:
+            return _flattened_commit(self)
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if self._redo:
+            self._redo = []
+        layers.append({})
+        if tracer is not None:
+            tracer.span('commit', start, len(layers) - 1, 0)
+        return self
+
+    def reset(self, redo=False):
+        layers = self._layers
+        if layers is None:
+            if self._overriden:
+                self._count(len(self._created),
+                            len(self._created[0]) + len(self._overriden[0]))
+        elif len(layers) > 1:
+            self._count(len(layers) - 1, len(layers[-1]))
+        layers = self._layers  # Layout may have changed.
+        if layers is None:
+            return _flattened_reset(self, redo)
+        if len(layers) == 1:
+            raise NoRevisionException()
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        changes = layers.pop()
+        if redo:
+            self._redo.append(changes)
+        elif self._redo:
+            self._redo = []
+        if tracer is not None:
+            tracer.span('reset', start, len(layers) - 1, len(changes))
+        return self
+
+    def _has_layers(self):
+        if self._layers is None:
+            return bool(self._overriden)
+        return len(self._layers) > 1
+
+    @property
+    def depth(self):
+        """Depth of current layer, i.e. number of layers on top of the
+        base."""
+        if self._layers is None:
+            return len(self._created)
+        return len(self._layers) - 1
+
+    __copy__ = _layout_method('__copy__')
+    __len__ = _layout_method('__len__')
+    __delitem__ = _layout_method('__delitem__')
+    keys = _layout_method('keys')
+    values = _layout_method('values')
+    items = _layout_method('items')
+    iterkeys = _layout_method('iterkeys')
+    itervalues = _layout_method('itervalues')
+    iteritems = _layout_method('iteritems')
+    viewkeys = _layout_method('viewkeys')
+    viewvalues = _layout_method('viewvalues')
+    viewitems = _layout_method('viewitems')
+    clear = _layout_method('clear')
+    pop = _layout_method('pop')
+    popitem = _layout_method('popitem')
+    _forward_changes = _layout_method('_forward_changes')
+
@@ -0,0 +1,107 @@
+"""StackedDict variant with bounded history."""
+from collections import deque
+
+from wardrobe.stackeddict import NoRevisionException, StackedDict
+
+
+class BoundedStackedDict(StackedDict):
+    """StackedDict which squashes its oldest layers into the base when history
+    gets too long.
+
+    Limits are checked at each :py:meth:`commit`:
+
+    * :py:attr:`max_depth` bounds the number of layers;
+    * :py:attr:`max_backups` bounds the number of values backed up in layers
+      below the current one.
+
+    Both default to ``None``, i.e. no limit. Set them in subclasses or on
+    instances.
+
+    >>> from wardrobe import BoundedStackedDict
+    >>> s = BoundedStackedDict(a=0)
+    >>> s.max_depth = 2
+    >>> for value in range(1, 5):
+    ...     s.commit()['a'] = value
+    >>> s.depth
+    2
+    >>> s.reset().reset()['a']
+    2
+    >>> s.reset()
+    Traceback (most recent call last):
+    ...
+    NoRevisionException
+
+    Oldest layers are squashed first.
+
+    >>> s = BoundedStackedDict(a=0, b=0)
+    >>> s.max_backups = 2
+    >>> s.commit().update(a=1, b=1)
+    >>> s.commit()['a'] = 2
+    >>> s.commit()['a'] = 3
+    >>> s.depth
+    2
+    >>> dict(s.reset()) == {'a': 2, 'b': 1}
+    True
+
+    """
+    #: Maximum number of layers, or ``None``.
+    max_depth = None
+
+    #: Maximum number of backed up values in layers below the current one, or
+    #: ``None``.
+    max_backups = None
+
+    def __init__(self, initial=None, **kwargs):
+        super(BoundedStackedDict, self).__init__(initial, **kwargs)
+        self._backup_counts = deque([])  # Store number of backups in each
+                                         # layer below the current one.
+        self._backups = 0  # Total of _backup_counts.
+
+    def __copy__(self):
+        duplicate = super(BoundedStackedDict, self).__copy__()
+        duplicate._backup_counts = deque(self._backup_counts)
+        return duplicate
+
+    def squash(self):
+        """Merge oldest layer into the base, discarding its backups.
+
+        >>> s = BoundedStackedDict(a=1)
+        >>> s.commit()['a'] = 2
+        >>> s.commit()['a'] = 3
+        >>> s.squash()
+        >>> s.reset()['a']
+        2
+        >>> s.squash()
+        Traceback (most recent call last):
+        ...
+        NoRevisionException
+
+        """
+        if not self._has_layers():
+            raise NoRevisionException()
+        self._created.pop()
+        self._overriden.pop()
+        if self._backup_counts:
+            self._backups -= self._backup_counts.pop()
+
+    def commit(self):
+        if self._has_layers():
+            count = len(self._overriden[0])
+            self._backup_counts.appendleft(count)
+            self._backups += count
+        super(BoundedStackedDict, self).commit()
+        max_depth = self.max_depth
+        if max_depth is not None:
+            while len(self._created) > max_depth:
+                self.squash()
+        max_backups = self.max_backups
+        if max_backups is not None:
+            while self._backups > max_backups:
+                self.squash()
+        return self
+
+    def reset(self, redo=False):
+        super(BoundedStackedDict, self).reset(redo)
+        if self._backup_counts:
+            self._backups -= self._backup_counts.popleft()
+        return self
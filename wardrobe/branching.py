@@ -0,0 +1,242 @@
+"""StackedDict variant with named branches of layers."""
+from wardrobe.stackeddict import StackedDict
+
+
+class _Layer(object):
+    """Node in the tree of layers.
+
+    While a layer is active, i.e. on the path from the base to the current
+    layer, its changes are recorded in ``_created`` and ``_overriden``
+    attributes of the StackedDict, as usual. When it gets inactive, its
+    forward changes are stored in ``changes``, so that it can be replayed
+    later.
+
+    """
+    __slots__ = ('parent', 'depth', 'changes')
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.changes = None
+
+
+class BranchingStackedDict(StackedDict):
+    """StackedDict where layers form a tree of named branches.
+
+    :py:meth:`branch` starts a new branch from current layer,
+    :py:meth:`checkout` switches between branches. Switching only unwinds and
+    replays the layers between the two branches and their common ancestor.
+
+    >>> from wardrobe import BranchingStackedDict
+    >>> s = BranchingStackedDict(move=None, score=0)
+    >>> s.current_branch
+    'main'
+    >>> s.branch('left').update(move='left', score=1)
+    >>> s.checkout('main').branch('right').update(move='right', score=2)
+    >>> s.commit()['bonus'] = True
+    >>> dict(s.checkout('left')) == {'move': 'left', 'score': 1}
+    True
+    >>> dict(s.checkout('right')) == {'move': 'right', 'score': 2,
+    ...                               'bonus': True}
+    True
+    >>> dict(s.checkout('main')) == {'move': None, 'score': 0}
+    True
+    >>> sorted(s.branches)
+    ['left', 'main', 'right']
+
+    Branches share the layers they fork from. Changes made in a shared layer,
+    i.e. when the branch which holds it as current layer is checked out, are
+    seen by other branches the next time they are checked out: their own
+    layers are replayed on top of it.
+
+    """
+    #: Name of the branch that instances start with.
+    default_branch = 'main'
+
+    def __init__(self, initial=None, **kwargs):
+        super(BranchingStackedDict, self).__init__(initial, **kwargs)
+        self._root = _Layer(None)  # Base layer.
+        self._path = []  # Active layers, from the base (excluded) to the
+                         # current layer.
+        self._branch = self.default_branch
+        self._branches = {self._branch: self._root}  # Current layer of each
+                                                     # branch.
+
+    def __copy__(self):
+        """Copy operator: the tree of layers is copied too.
+
+        >>> s1 = BranchingStackedDict(a=1)
+        >>> s1.branch('b')['a'] = 2
+        >>> s2 = s1.checkout('main').copy()
+        >>> s2.checkout('b')['a'] = 3
+        >>> s1.checkout('b')['a']
+        2
+
+        """
+        duplicate = super(BranchingStackedDict, self).__copy__()
+        clones = {}
+
+        def clone(layer):
+            if layer is None:
+                return None
+            try:
+                return clones[id(layer)]
+            except KeyError:
+                duplicate = _Layer(clone(layer.parent))
+                if layer.changes is not None:
+                    duplicate.changes = dict(layer.changes)
+                clones[id(layer)] = duplicate
+                return duplicate
+
+        duplicate._root = clone(self._root)
+        duplicate._path = [clone(layer) for layer in self._path]
+        duplicate._branches = dict((name, clone(layer)) for name, layer
+                                   in self._branches.iteritems())
+        return duplicate
+
+    def _tip(self):
+        """Return current layer."""
+        if self._path:
+            return self._path[-1]
+        return self._root
+
+    @property
+    def current_branch(self):
+        """Name of the current branch."""
+        return self._branch
+
+    @property
+    def branches(self):
+        """List of branch names."""
+        return self._branches.keys()
+
+    def branch(self, name):
+        """Start branch ``name`` from current layer and check it out.
+
+        The new branch starts with a new layer, i.e. :py:meth:`branch`
+        implies :py:meth:`commit`. Returns instance, so that you can chain
+        operations.
+
+        >>> s = BranchingStackedDict(a=1)
+        >>> s.branch('b')['a'] = 2
+        >>> s.checkout('main')['a']
+        1
+        >>> s.branch('b')
+        Traceback (most recent call last):
+        ...
+        ValueError: Branch 'b' already exists.
+
+        """
+        if name in self._branches:
+            raise ValueError('Branch %r already exists.' % name)
+        self._branches[name] = self._tip()
+        self._branch = name
+        return self.commit()
+
+    def delete_branch(self, name):
+        """Forget about branch ``name``.
+
+        >>> s = BranchingStackedDict()
+        >>> s.branch('b').delete_branch('main')
+        >>> s.branches
+        ['b']
+        >>> s.delete_branch('b')
+        Traceback (most recent call last):
+        ...
+        ValueError: Cannot delete current branch 'b'.
+
+        """
+        if name == self._branch:
+            raise ValueError('Cannot delete current branch %r.' % name)
+        del self._branches[name]
+
+    def checkout(self, name):
+        """Switch to branch ``name``.
+
+        Layers of current branch are unwound down to the common ancestor of
+        both branches, then layers of target branch are replayed. Returns
+        instance, so that you can chain operations.
+
+        >>> s = BranchingStackedDict(a=1)
+        >>> s.checkout('unknown')
+        Traceback (most recent call last):
+        ...
+        KeyError: 'unknown'
+
+        """
+        target = self._branches[name]
+        # Find common ancestor.
+        ancestor = self._tip()
+        layer = target
+        while ancestor.depth > layer.depth:
+            ancestor = ancestor.parent
+        while layer.depth > ancestor.depth:
+            layer = layer.parent
+        while layer is not ancestor:
+            layer = layer.parent
+            ancestor = ancestor.parent
+        # Unwind current branch.
+        while self._tip() is not ancestor:
+            self._unwind()
+        # Replay target branch.
+        replay = []
+        layer = target
+        while layer is not ancestor:
+            replay.append(layer)
+            layer = layer.parent
+        for layer in reversed(replay):
+            self._replay(layer)
+        self._branch = name
+        return self
+
+    def _unwind(self, redo=False):
+        """Record changes of current layer in the layer itself, then reset
+        it."""
+        layer = self._path[-1]
+        if redo:
+            super(BranchingStackedDict, self).reset(redo=True)
+            layer.changes = self._redo[-1]
+        else:
+            layer.changes = self._forward_changes()
+            super(BranchingStackedDict, self).reset()
+        self._path.pop()
+
+    def _replay(self, layer):
+        """Re-apply changes of inactive layer on top of current layer."""
+        super(BranchingStackedDict, self).commit()
+        self._apply(layer.changes)
+        layer.changes = None
+        self._path.append(layer)
+
+    def commit(self):
+        """Save current state in a new layer of current branch."""
+        super(BranchingStackedDict, self).commit()
+        layer = _Layer(self._tip())
+        self._path.append(layer)
+        self._branches[self._branch] = layer
+        return self
+
+    def reset(self, redo=False):
+        """Drop current layer of current branch.
+
+        Other branches may still use the dropped layer: its changes are kept
+        for them.
+
+        >>> s = BranchingStackedDict(a=1)
+        >>> s.commit()['a'] = 2
+        >>> s.branch('b')['a'] = 3
+        >>> s.checkout('main').reset()['a']
+        1
+        >>> s.checkout('b')['a']
+        3
+        >>> s.reset().reset()['a']
+        1
+
+        """
+        if len(self._branches) > 1 and self._path:
+            self._unwind(redo)
+        else:
+            super(BranchingStackedDict, self).reset(redo)
+            self._path.pop()
+        self._branches[self._branch] = self._tip()
+        return self
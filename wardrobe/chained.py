@@ -0,0 +1,252 @@
+"""StackedDict variant which stores one dict per layer."""
+from collections import deque, ItemsView, KeysView, ValuesView
+from copy import copy
+
+from wardrobe.stackeddict import _DELETED, NoRevisionException, StackedDict
+
+
+#: Marker for keys missing from a layer.
+_MISSING = object()
+
+
+def chain(values, created, overriden):
+    """Return list of layers, base first, from the flattened representation
+    of a StackedDict, i.e. its values, created keys and backups.
+
+    Layers map keys to values set in them, or to ``_DELETED`` for keys they
+    deleted. Arguments are not modified.
+
+    >>> from wardrobe.stackeddict import StackedDict
+    >>> s = StackedDict(a=1, b=2)
+    >>> s.commit().update(a='A', c=3)
+    >>> del s['b']
+    >>> layers = chain(s._dict, s._created, s._overriden)
+    >>> layers[0] == {'a': 1, 'b': 2}
+    True
+    >>> layers[1] == {'a': 'A', 'b': _DELETED, 'c': 3}
+    True
+
+    """
+    values = dict(values)
+    layers = []
+    for layer_created, layer_overriden in zip(created, overriden):
+        layer = {}
+        for key in layer_created:
+            layer[key] = values.pop(key)
+        for key, value in layer_overriden.iteritems():
+            # Keys deleted then set again are also in created keys.
+            layer.setdefault(key, values.get(key, _DELETED))
+            values[key] = value
+        layers.append(layer)
+    layers.append(values)
+    layers.reverse()
+    return layers
+
+
+def flatten(layers):
+    """Return (values, created keys, backups) from list of layers, i.e. the
+    reverse of :py:func:`chain`.
+
+    The base layer is used as values, so it is modified.
+
+    """
+    values = layers[0]
+    created = deque()
+    overriden = deque()
+    for layer in layers[1:]:
+        layer_created = set()
+        layer_overriden = {}
+        for key, value in layer.iteritems():
+            old_value = values.get(key, _MISSING)
+            if old_value is _MISSING:
+                if value is _DELETED:
+                    continue
+                layer_created.add(key)
+            else:
+                layer_overriden[key] = old_value
+            if value is _DELETED:
+                values.pop(key, None)
+            else:
+                values[key] = value
+        created.appendleft(layer_created)
+        overriden.appendleft(layer_overriden)
+    return values, created, overriden
+
+
+class ChainedStackedDict(StackedDict):
+    """StackedDict which stores one dict per layer.
+
+    Writes go to the dict of the current layer, deletions of keys defined in
+    lower layers are recorded as markers. Reads look layers up from the
+    current one down. So :py:meth:`commit`, :py:meth:`reset` and writes cost
+    constant time, whereas reads cost up to the depth, and iteration or
+    :py:func:`len` cost the total size of layers.
+
+    >>> from wardrobe import ChainedStackedDict
+    >>> s = ChainedStackedDict(top='blue', bottom='red')
+    >>> s.commit().update(top='white', cape='red')
+    >>> del s['bottom']
+    >>> sorted(s.items())
+    [('cape', 'red'), ('top', 'white')]
+    >>> sorted(s.reset().items())
+    [('bottom', 'red'), ('top', 'blue')]
+
+    It suits write-heavy workloads with frequent resets on shallow stacks.
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(ChainedStackedDict, self).__init__(initial, **kwargs)
+        self._layers = [self._dict]  # Base layer first.
+        del self._dict, self._created, self._overriden
+
+    def __copy__(self):
+        duplicate = copy(super(StackedDict, self))
+        duplicate._layers = [dict(layer) for layer in self._layers]
+        duplicate._redo = copy(self._redo)
+        return duplicate
+
+    def _has_layers(self):
+        return len(self._layers) > 1
+
+    @property
+    def depth(self):
+        return len(self._layers) - 1
+
+    def _find(self, key, layers):
+        """Return value of key in topmost of layers which defines it, or
+        ``_DELETED``."""
+        for layer in reversed(layers):
+            value = layer.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return _DELETED
+
+    def _visible_items(self, layers):
+        """Return list of (key, value) items defined by layers."""
+        items = []
+        seen = set()
+        for layer in reversed(layers):
+            for key, value in layer.iteritems():
+                if key not in seen:
+                    seen.add(key)
+                    if value is not _DELETED:
+                        items.append((key, value))
+        return items
+
+    def _delete(self, key):
+        """Delete existing key in current layer."""
+        if self._redo:
+            self._redo = []
+        layers = self._layers
+        if len(layers) > 1 and self._find(key, layers[:-1]) is not _DELETED:
+            layers[-1][key] = _DELETED
+        else:
+            del layers[-1][key]
+
+    def __getitem__(self, key):
+        value = self._find(key, self._layers)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if self._redo:
+            self._redo = []
+        self._layers[-1][key] = value
+
+    def __delitem__(self, key):
+        if self._find(key, self._layers) is _DELETED:
+            raise KeyError(key)
+        self._delete(key)
+
+    def __len__(self):
+        return len(self._visible_items(self._layers))
+
+    def has_key(self, key):
+        return self._find(key, self._layers) is not _DELETED
+
+    def keys(self):
+        return [key for key, value in self._visible_items(self._layers)]
+
+    def values(self):
+        return [value for key, value in self._visible_items(self._layers)]
+
+    def items(self):
+        return self._visible_items(self._layers)
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def viewkeys(self):
+        return KeysView(self)
+
+    def viewvalues(self):
+        return ValuesView(self)
+
+    def viewitems(self):
+        return ItemsView(self)
+
+    def clear(self):
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+            entries = len(self)
+        if self._redo:
+            self._redo = []
+        layers = self._layers
+        layers[-1].clear()
+        if len(layers) > 1:
+            for key, value in self._visible_items(layers[:-1]):
+                layers[-1][key] = _DELETED
+        if tracer is not None:
+            tracer.span('clear', start, self.depth, entries)
+
+    def pop(self, key, *args):
+        value = self._find(key, self._layers)
+        if value is _DELETED:
+            if args:
+                return args[0]
+            raise KeyError(key)
+        self._delete(key)
+        return value
+
+    def popitem(self):
+        for key, value in self._visible_items(self._layers):
+            self._delete(key)
+            return key, value
+        raise KeyError('popitem(): dictionary is empty')
+
+    def commit(self):
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if self._redo:
+            self._redo = []
+        self._layers.append({})
+        if tracer is not None:
+            tracer.span('commit', start, self.depth, 0)
+        return self
+
+    def _forward_changes(self):
+        return dict(self._layers[-1])
+
+    def reset(self, redo=False):
+        if len(self._layers) == 1:
+            raise NoRevisionException()
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        changes = self._layers.pop()
+        if redo:
+            self._redo.append(changes)
+        elif self._redo:
+            self._redo = []
+        if tracer is not None:
+            tracer.span('reset', start, self.depth, len(changes))
+        return self
@@ -0,0 +1,447 @@
+"""StackedDict variant that protects mutable values with copy-on-write."""
+from collections import deque
+from operator import add, and_, ge, gt, le, lt, mul, or_, sub, xor
+
+from wardrobe.stackeddict import StackedDict
+
+
+def _wrap(owner, key, path, value):
+    """Return a copy-on-write proxy for value if it is a list, a dict or a
+    set, else return value itself."""
+    proxy_class = _PROXY_CLASSES.get(type(value))
+    if proxy_class is None:
+        return value
+    return proxy_class(owner, key, path, value)
+
+
+def _unwrap(value):
+    """Return the object behind value if it is a proxy, else value itself."""
+    if isinstance(value, _Proxy):
+        return value._target()
+    return value
+
+
+class _Proxy(object):
+    """Base class for copy-on-write proxies.
+
+    A proxy is bound to the value it was created for, and to the path of the
+    value, i.e. the key in the owner and the indexes in nested values. As
+    long as the value at that path is the value, or copies of it made by
+    layers, the proxy targets the value at that path. Once the value has been
+    replaced, e.g. by an assignment or by :py:meth:`StackedDict.reset`, the
+    proxy is detached: it targets the value it was created for, and mutates
+    it in place, as with a value removed from a dict.
+
+    Mutating methods are run against a copy owned by the current layer, other
+    attributes are read from the current value. :py:attr:`__class__` is the
+    class of the current value, so that :py:func:`isinstance` sees through
+    proxies, but :py:func:`type` doesn't.
+
+    """
+    __slots__ = ('_owner', '_key', '_path', '_value')
+    __hash__ = None
+
+    def __init__(self, owner, key, path, value):
+        self._owner = owner
+        self._key = key
+        self._path = path
+        self._value = value
+
+    def _target(self):
+        """Return current value."""
+        current = self._owner._current(self._key, self._path, self._value)
+        if current is None:
+            return self._value
+        return current
+
+    def _writable(self):
+        """Return a version of current value that can be mutated in place."""
+        if self._owner._current(self._key, self._path, self._value) is None:
+            return self._value
+        return self._owner._writable(self._key, self._path)
+
+    def _wrap(self, step, value):
+        return _wrap(self._owner, self._key, self._path + (step,), value)
+
+    @property
+    def __class__(self):
+        return type(self._target())
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __len__(self):
+        return len(self._target())
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __contains__(self, item):
+        return item in self._target()
+
+    def __eq__(self, other):
+        return self._target() == _unwrap(other)
+
+    def __ne__(self, other):
+        return self._target() != _unwrap(other)
+
+    def __lt__(self, other):
+        return self._target() < _unwrap(other)
+
+    def __le__(self, other):
+        return self._target() <= _unwrap(other)
+
+    def __gt__(self, other):
+        return self._target() > _unwrap(other)
+
+    def __ge__(self, other):
+        return self._target() >= _unwrap(other)
+
+    def __nonzero__(self):
+        return bool(self._target())
+
+    def __repr__(self):
+        return repr(self._target())
+
+
+def _mutator(name):
+    """Return proxy method that runs method ``name`` on a writable value."""
+    def method(self, *args, **kwargs):
+        return getattr(self._writable(), name)(*args, **kwargs)
+    method.__name__ = name
+    return method
+
+
+def _operators(name, function):
+    """Return proxy methods for binary operator ``name`` and its reflected
+    version, which apply function to current value, as {name: method}."""
+    def method(self, other):
+        return function(self._target(), _unwrap(other))
+
+    def reflected_method(self, other):
+        return function(_unwrap(other), self._target())
+    method.__name__ = '__%s__' % name
+    reflected_method.__name__ = '__r%s__' % name
+    return {method.__name__: method,
+            reflected_method.__name__: reflected_method}
+
+
+def _inplace_operator(name):
+    """Return proxy method for in-place operator ``name``, which returns the
+    proxy itself."""
+    def method(self, other):
+        getattr(self._writable(), name)(_unwrap(other))
+        return self
+    method.__name__ = name
+    return method
+
+
+class ListProxy(_Proxy):
+    """Copy-on-write proxy for lists."""
+    __slots__ = ()
+
+    def _index(self, index):
+        """Return positive index, so that it is still valid after size of the
+        list changed."""
+        if index < 0:
+            index += len(self._target())
+        return index
+
+    def __getitem__(self, index):
+        target = self._target()
+        if isinstance(index, slice):
+            return [self._wrap(position, target[position])
+                    for position in xrange(*index.indices(len(target)))]
+        index = self._index(index)
+        return self._wrap(index, target[index])
+
+    def __iter__(self):
+        for index, value in enumerate(self._target()):
+            yield self._wrap(index, value)
+
+    def __reversed__(self):
+        target = self._target()
+        for index in xrange(len(target) - 1, -1, -1):
+            yield self._wrap(index, target[index])
+
+    def __setitem__(self, index, value):
+        self._writable()[index] = _unwrap(value)
+
+    def append(self, value):
+        self._writable().append(_unwrap(value))
+
+    def insert(self, index, value):
+        self._writable().insert(index, _unwrap(value))
+
+    for name in ('__delitem__', 'extend', 'pop', 'remove', 'reverse', 'sort'):
+        locals()[name] = _mutator(name)
+    for name in ('__iadd__', '__imul__'):
+        locals()[name] = _inplace_operator(name)
+    locals().update(_operators('add', add))
+    locals().update(_operators('mul', mul))
+    del name
+
+
+class DictProxy(_Proxy):
+    """Copy-on-write proxy for dicts."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return self._wrap(key, self._target()[key])
+
+    def __setitem__(self, key, value):
+        self._writable()[key] = _unwrap(value)
+
+    def get(self, key, default=None):
+        target = self._target()
+        if key in target:
+            return self._wrap(key, target[key])
+        return default
+
+    def setdefault(self, key, default=None):
+        if key not in self._target():
+            self._writable()[key] = _unwrap(default)
+        return self[key]
+
+    def iteritems(self):
+        for key, value in self._target().iteritems():
+            yield key, self._wrap(key, value)
+
+    def itervalues(self):
+        for key, value in self._target().iteritems():
+            yield self._wrap(key, value)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    for name in ('__delitem__', 'clear', 'pop', 'popitem', 'update'):
+        locals()[name] = _mutator(name)
+    del name
+
+
+class SetProxy(_Proxy):
+    """Copy-on-write proxy for sets."""
+    __slots__ = ()
+
+    for name in ('add', 'clear', 'difference_update', 'discard',
+                 'intersection_update', 'pop', 'remove',
+                 'symmetric_difference_update', 'update'):
+        locals()[name] = _mutator(name)
+    for name in ('__iand__', '__ior__', '__isub__', '__ixor__'):
+        locals()[name] = _inplace_operator(name)
+    for name, function in (('and', and_), ('or', or_), ('sub', sub),
+                           ('xor', xor)):
+        locals().update(_operators(name, function))
+    del name, function
+
+
+#: Proxy class of each protected type. Subclasses of these types are not
+#: protected.
+_PROXY_CLASSES = {list: ListProxy, dict: DictProxy, set: SetProxy}
+
+
+class CopyOnWriteStackedDict(StackedDict):
+    """StackedDict where in-place mutations of values are rolled back too.
+
+    Lists, dicts and sets are returned wrapped in copy-on-write proxies. The
+    first time such a value is mutated in a layer, the layer backs up the
+    original value and works on a shallow copy. Nested values are copied
+    along the mutated path only.
+
+    With a standard StackedDict, :py:meth:`reset` doesn't undo in-place
+    mutations:
+
+    >>> from wardrobe import StackedDict, CopyOnWriteStackedDict
+    >>> s = StackedDict(tags=['hero'])
+    >>> s.commit()['tags'].append('alien')
+    >>> s.reset()['tags']
+    ['hero', 'alien']
+
+    With CopyOnWriteStackedDict, it does:
+
+    >>> s = CopyOnWriteStackedDict(tags=['hero'],
+    ...                            options={'paths': ['/tmp'], 'debug': False})
+    >>> s.commit()['tags'].append('alien')
+    >>> s['options']['paths'].append('/var')
+    >>> s['options']['debug'] = True
+    >>> s['tags']
+    ['hero', 'alien']
+    >>> s['options'] == {'paths': ['/tmp', '/var'], 'debug': True}
+    True
+    >>> silent = s.reset()
+    >>> s['tags']
+    ['hero']
+    >>> s['options'] == {'paths': ['/tmp'], 'debug': False}
+    True
+
+    When there is no layer, values are mutated in place.
+
+    Proxies support the operators and comparisons of the values they wrap,
+    and :py:func:`isinstance` checks:
+
+    >>> s['tags'] + ['alien'], ['alien'] + s['tags'], s['tags'] * 2
+    (['hero', 'alien'], ['alien', 'hero'], ['hero', 'hero'])
+    >>> s['tags'] < ['zorro'], isinstance(s['tags'], list)
+    (True, True)
+
+    A proxy is bound to the value it was read from, like a reference to a
+    value of a dict. Once the value is replaced, the proxy mutates the former
+    value:
+
+    >>> tags = s['tags']
+    >>> s['tags'] = ['new']
+    >>> tags.append('former')
+    >>> s['tags'], tags
+    (['new'], ['hero', 'former'])
+
+    .. note::
+
+       Only values of exact types list, dict and set are protected, and only
+       when they are reached through item access (``s[key]``, ``get()``,
+       :py:meth:`values`, ...) or iteration. Values returned by the views
+       (:py:meth:`viewitems`, :py:meth:`viewvalues`) are not protected.
+       Code which checks exact types, such as :py:func:`type` or the
+       default encoder of :py:func:`json.dumps`, doesn't accept proxies: it
+       can be given the values of the views.
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(CopyOnWriteStackedDict, self).__init__(initial, **kwargs)
+        self._owned = deque([])  # Store values copied in each layer, by id.
+        self._originals = deque([])  # Store (copy, original) pairs of values
+                                     # copied in each layer, by id of copy.
+
+    def __copy__(self):
+        """Copy operator.
+
+        Copies share values: none of them is considered owned by a layer
+        anymore.
+
+        >>> s1 = CopyOnWriteStackedDict(tags=['hero'])
+        >>> s2 = s1.commit().copy()
+        >>> s2['tags'].append('alien')
+        >>> s1['tags']
+        ['hero']
+
+        """
+        duplicate = super(CopyOnWriteStackedDict, self).__copy__()
+        for owned in self._owned:
+            owned.clear()
+        duplicate._owned = deque([{} for owned in self._owned])
+        duplicate._originals = deque([{} for owned in self._owned])
+        return duplicate
+
+    def __getitem__(self, key):
+        """Get a variable's value, wrapped in a proxy if it is mutable.
+
+        >>> s = CopyOnWriteStackedDict(a=1, b=[1])
+        >>> s['a']
+        1
+        >>> s['b']
+        [1]
+        >>> type(s['b'])
+        <class 'wardrobe.copyonwrite.ListProxy'>
+
+        """
+        return _wrap(self, key, (), self._dict[key])
+
+    def __setitem__(self, key, value):
+        """Set value of key. Proxies are replaced by the values they target.
+
+        >>> s = CopyOnWriteStackedDict(a=[1])
+        >>> s['b'] = s['a']
+        >>> type(s._dict['b'])
+        <type 'list'>
+
+        """
+        super(CopyOnWriteStackedDict, self).__setitem__(key, _unwrap(value))
+
+    def _resolve(self, key, path):
+        """Return value at path in value of key."""
+        value = self._dict[key]
+        for step in path:
+            value = value[step]
+        return value
+
+    def _current(self, key, path, value):
+        """Return value at path in value of key, if it is value or a copy of
+        value made by layers, else None."""
+        try:
+            current = self._resolve(key, path)
+        except (KeyError, IndexError, TypeError):
+            return None
+        candidate = current
+        while candidate is not value:
+            for originals in self._originals:
+                if id(candidate) in originals:
+                    candidate = originals[id(candidate)][1]
+                    break
+            else:
+                return None
+        return current
+
+    def _writable(self, key, path):
+        """Return value at path in value of key, after values along the path
+        have been copied in current layer."""
+        if self._redo:
+            self._redo = []
+        if not self._has_layers():
+            return self._resolve(key, path)
+        owned = self._owned[0]
+        originals = self._originals[0]
+        value = self._dict[key]
+        if id(value) not in owned:
+            if key not in self._created[0] and key not in self._overriden[0]:
+                self._overriden[0][key] = value
+            original, value = value, type(value)(value)
+            owned[id(value)] = value
+            originals[id(value)] = (value, original)
+            self._dict[key] = value
+        for step in path:
+            child = value[step]
+            if id(child) not in owned:
+                original, child = child, type(child)(child)
+                owned[id(child)] = child
+                originals[id(child)] = (child, original)
+                value[step] = child
+            value = child
+        return value
+
+    def iteritems(self):
+        """Return an iterator over (key, value) pairs, with mutable values
+        wrapped in proxies."""
+        for key, value in self._dict.iteritems():
+            yield key, _wrap(self, key, (), value)
+
+    def itervalues(self):
+        """Return an iterator over values, with mutable values wrapped in
+        proxies."""
+        for key, value in self._dict.iteritems():
+            yield _wrap(self, key, (), value)
+
+    def values(self):
+        """Return list of values, with mutable values wrapped in proxies.
+
+        >>> s = CopyOnWriteStackedDict(a=[1])
+        >>> values = s.commit().values()
+        >>> values[0].append(2)
+        >>> s.reset()['a']
+        [1]
+
+        """
+        return list(self.itervalues())
+
+    def commit(self):
+        super(CopyOnWriteStackedDict, self).commit()
+        self._owned.appendleft({})
+        self._originals.appendleft({})
+        return self
+
+    def reset(self, redo=False):
+        super(CopyOnWriteStackedDict, self).reset(redo)
+        self._owned.popleft()
+        self._originals.popleft()
+        return self
@@ -0,0 +1,108 @@
+"""StackedDict variant with an incrementally maintained fingerprint."""
+from wardrobe.observable import MISSING, ObservableStackedDict
+
+
+#: Fingerprints are sums of item hashes, modulo 2 ** 64.
+_MASK = (1 << 64) - 1
+
+
+def _item_hash(key, value):
+    """Return hash of (key, value) item, or None if value isn't hashable."""
+    try:
+        return hash((key, value))
+    except TypeError:
+        return None
+
+
+class FingerprintStackedDict(ObservableStackedDict):
+    """StackedDict which maintains a fingerprint of its contents.
+
+    The fingerprint is the sum of the hashes of (key, value) items, so it
+    doesn't depend on order and is updated in constant time by each change,
+    including those made by :py:meth:`reset`.
+
+    >>> from wardrobe import FingerprintStackedDict
+    >>> s = FingerprintStackedDict(a=1, b=2)
+    >>> before = s.fingerprint
+    >>> s.commit()['a'] = 'A'
+    >>> s.fingerprint == before
+    False
+    >>> s.reset().fingerprint == before
+    True
+    >>> FingerprintStackedDict(b=2, a=1).fingerprint == before
+    True
+
+    Fingerprints are computed with the built-in :py:func:`hash`, so they are
+    only comparable within a process. They are ``None`` while some values are
+    not hashable.
+
+    >>> s['c'] = ['unhashable']
+    >>> s.fingerprint is None
+    True
+    >>> del s['c']
+    >>> s.fingerprint == before
+    True
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(FingerprintStackedDict, self).__init__(initial, **kwargs)
+        self._fingerprint = 0
+        self._unhashable = 0  # Number of values that cannot be hashed.
+        for key, value in self._dict.iteritems():
+            self._changed(key, MISSING, value)
+
+    @property
+    def fingerprint(self):
+        """Order-independent hash of contents, or ``None`` if some values are
+        not hashable."""
+        if self._unhashable:
+            return None
+        return self._fingerprint
+
+    def _changed(self, key, old_value, new_value):
+        fingerprint = self._fingerprint
+        if old_value is not MISSING:
+            item_hash = _item_hash(key, old_value)
+            if item_hash is None:
+                self._unhashable -= 1
+            else:
+                fingerprint -= item_hash
+        if new_value is not MISSING:
+            item_hash = _item_hash(key, new_value)
+            if item_hash is None:
+                self._unhashable += 1
+            else:
+                fingerprint += item_hash
+        self._fingerprint = fingerprint & _MASK
+        super(FingerprintStackedDict, self)._changed(key, old_value,
+                                                     new_value)
+
+    def __eq__(self, other):
+        """Equality operator.
+
+        Different lengths or fingerprints tell that instances differ, without
+        comparing contents.
+
+        >>> s1 = FingerprintStackedDict(a=1, b=2)
+        >>> s2 = FingerprintStackedDict(a=1)
+        >>> s1 == s2
+        False
+        >>> s2['b'] = 2
+        >>> s1 == s2
+        True
+        >>> s1 == {'a': 1, 'b': 2}
+        True
+
+        """
+        if isinstance(other, FingerprintStackedDict):
+            if len(self._dict) != len(other._dict):
+                return False
+            fingerprint = self.fingerprint
+            if fingerprint is not None and other.fingerprint is not None \
+               and fingerprint != other.fingerprint:
+                return False
+            return self._dict == other._dict
+        return super(FingerprintStackedDict, self).__eq__(other)
+
+    def __ne__(self, other):
+        return not self == other
@@ -0,0 +1,170 @@
+"""StackedDict variant with an index of the layers that changed each key."""
+from bisect import bisect_right
+
+from wardrobe.stackeddict import StackedDict
+
+
+class HistoryStackedDict(StackedDict):
+    """StackedDict which can read values as they were in former layers.
+
+    Layers are numbered by depth: the base is at depth 0, each
+    :py:meth:`commit` adds one. For each key, an index keeps the (sorted)
+    depths of the layers that recorded a backup or a creation of the key. So
+    historical lookups cost a bisection in the index of the key, whatever the
+    total depth.
+
+    >>> from wardrobe import HistoryStackedDict
+    >>> s = HistoryStackedDict(theme='light')
+    >>> s.commit()['theme'] = 'dark'
+    >>> s.commit()['theme'] = 'solarized'
+    >>> s.depth
+    2
+    >>> s.get('theme', depth=0)
+    'light'
+    >>> s.get('theme', depth=1)
+    'dark'
+    >>> s.get('theme')
+    'solarized'
+
+    The same index tells which layer defines each key.
+
+    >>> s.layer_of('theme')
+    2
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(HistoryStackedDict, self).__init__(initial, **kwargs)
+        self._touched = {}  # Store depths of layers which recorded each key.
+
+    def __copy__(self):
+        duplicate = super(HistoryStackedDict, self).__copy__()
+        duplicate._touched = dict((key, list(depths)) for key, depths
+                                  in self._touched.iteritems())
+        return duplicate
+
+    def _record(self, key):
+        """Update index of key after it changed in current layer."""
+        depth = len(self._created)
+        if key in self._created[0] or key in self._overriden[0]:
+            depths = self._touched.setdefault(key, [])
+            if not depths or depths[-1] != depth:
+                depths.append(depth)
+        else:
+            depths = self._touched.get(key)
+            if depths and depths[-1] == depth:
+                depths.pop()
+                if not depths:
+                    del self._touched[key]
+
+    def __setitem__(self, key, value):
+        super(HistoryStackedDict, self).__setitem__(key, value)
+        if self._has_layers():
+            self._record(key)
+
+    def __delitem__(self, key):
+        super(HistoryStackedDict, self).__delitem__(key)
+        if self._has_layers():
+            self._record(key)
+
+    def clear(self):
+        if self._has_layers():
+            created = list(self._created[0])
+            super(HistoryStackedDict, self).clear()
+            for key in created:
+                self._record(key)
+            for key in self._overriden[0]:
+                self._record(key)
+        else:
+            super(HistoryStackedDict, self).clear()
+
+    def pop(self, key, *args):
+        present = key in self._dict
+        value = super(HistoryStackedDict, self).pop(key, *args)
+        if present and self._has_layers():
+            self._record(key)
+        return value
+
+    def popitem(self):
+        key, value = super(HistoryStackedDict, self).popitem()
+        if self._has_layers():
+            self._record(key)
+        return key, value
+
+    def get(self, key, default=None, depth=None):
+        """Return the value for key if key is in the dictionary, else default.
+
+        If ``depth`` is given, return the value of key as it was in the layer
+        at this depth, i.e. as it would be after :py:meth:`reset` down to
+        this depth. The dictionary isn't changed.
+
+        >>> s = HistoryStackedDict(a=1)
+        >>> s.commit().update(a='A', b='B')
+        >>> del s['a']
+        >>> s.get('a') is None
+        True
+        >>> s.get('a', depth=0)
+        1
+        >>> s.get('b', 'missing', depth=0)
+        'missing'
+        >>> s.get('b', depth=1)
+        'B'
+        >>> s.get('b', depth=-1)
+        Traceback (most recent call last):
+        ...
+        ValueError: depth must be non-negative, got -1
+
+        """
+        current = len(self._created)
+        if depth is None or depth >= current:
+            return super(HistoryStackedDict, self).get(key, default)
+        if depth < 0:
+            raise ValueError('depth must be non-negative, got %d' % depth)
+        depths = self._touched.get(key)
+        if depths:
+            index = bisect_right(depths, depth)
+            if index < len(depths):
+                # The first layer above depth which changed key holds its
+                # value at depth.
+                position = current - depths[index]
+                try:
+                    return self._overriden[position][key]
+                except KeyError:  # Key has been created in that layer.
+                    return default
+        return super(HistoryStackedDict, self).get(key, default)
+
+    def layer_of(self, key):
+        """Return depth of the layer which introduced or last overrode key.
+
+        Raises KeyError if key isn't in the dictionary.
+
+        >>> s = HistoryStackedDict(host='localhost', port=80)
+        >>> s.commit()['port'] = 8080
+        >>> s.commit()['debug'] = True
+        >>> s.layer_of('host'), s.layer_of('port'), s.layer_of('debug')
+        (0, 1, 2)
+        >>> del s['port']
+        >>> s.layer_of('port')
+        Traceback (most recent call last):
+        ...
+        KeyError: 'port'
+        >>> silent = s.reset()
+        >>> s.layer_of('port')
+        1
+
+        """
+        if key not in self._dict:
+            raise KeyError(key)
+        depths = self._touched.get(key)
+        if depths:
+            return depths[-1]
+        return 0
+
+    def reset(self, redo=False):
+        if self._has_layers():
+            touched = self._touched
+            for key in self._created[0].union(self._overriden[0]):
+                depths = touched[key]
+                depths.pop()
+                if not depths:
+                    del touched[key]
+        return super(HistoryStackedDict, self).reset(redo)
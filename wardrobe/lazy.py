@@ -0,0 +1,111 @@
+"""StackedDict variant with lazy values."""
+from wardrobe.stackeddict import StackedDict
+
+
+#: Marker for lazy values that haven't been evaluated yet.
+_PENDING = object()
+
+
+class Lazy(object):
+    """Value computed by ``function()`` the first time it is read.
+
+    The result is cached in the Lazy instance, i.e. in the layer where it was
+    set.
+
+    >>> from wardrobe.lazy import Lazy
+    >>> def compute():
+    ...     print('Computing...')
+    ...     return 42
+    >>> value = Lazy(compute)
+    >>> value.evaluated
+    False
+    >>> value.get()
+    Computing...
+    42
+    >>> value.get()
+    42
+
+    """
+    __slots__ = ('_function', '_value')
+
+    def __init__(self, function):
+        self._function = function
+        self._value = _PENDING
+
+    @property
+    def evaluated(self):
+        """Whether value has already been computed."""
+        return self._value is not _PENDING
+
+    def get(self):
+        """Return value, computing it on first call."""
+        if self._value is _PENDING:
+            self._value = self._function()
+            self._function = None
+        return self._value
+
+
+class LazyStackedDict(StackedDict):
+    """StackedDict which evaluates :py:class:`Lazy` values when they are read.
+
+    >>> from wardrobe import LazyStackedDict
+    >>> from wardrobe.lazy import Lazy
+    >>> def expensive():
+    ...     print('Computing...')
+    ...     return 'report'
+    >>> s = LazyStackedDict(title='Daily Planet')
+    >>> s.commit()['report'] = Lazy(expensive)
+    >>> s['title']
+    'Daily Planet'
+    >>> s['report']
+    Computing...
+    'report'
+    >>> s['report']
+    'report'
+
+    The computed value belongs to the layer where the Lazy value was set:
+    :py:meth:`reset` discards it together with that layer.
+
+    >>> 'report' in s.reset()
+    False
+
+    Reading values with ``get()``, :py:meth:`items`, :py:meth:`values` and
+    their iterator variants evaluates them too. Views
+    (:py:meth:`viewitems`, :py:meth:`viewvalues`) return Lazy values as is.
+
+    >>> s['report'] = Lazy(expensive)
+    >>> sorted(s.values())
+    Computing...
+    ['Daily Planet', 'report']
+
+    """
+    def __getitem__(self, key):
+        value = self._dict[key]
+        if type(value) is Lazy:
+            return value.get()
+        return value
+
+    def iteritems(self):
+        for key, value in self._dict.iteritems():
+            if type(value) is Lazy:
+                value = value.get()
+            yield key, value
+
+    def itervalues(self):
+        for key, value in self.iteritems():
+            yield value
+
+    def values(self):
+        return list(self.itervalues())
+
+    def pop(self, key, *args):
+        value = super(LazyStackedDict, self).pop(key, *args)
+        if type(value) is Lazy:
+            return value.get()
+        return value
+
+    def popitem(self):
+        key, value = super(LazyStackedDict, self).popitem()
+        if type(value) is Lazy:
+            value = value.get()
+        return key, value
@@ -0,0 +1,125 @@
+"""StackedDict variant with a capacity-bounded base layer."""
+from collections import OrderedDict
+
+from wardrobe.stackeddict import StackedDict
+
+
+class LRUStackedDict(StackedDict):
+    """StackedDict whose base layer holds at most :py:attr:`capacity` keys,
+    evicting least recently used ones.
+
+    Keys of the base layer are kept in order of use, i.e. of reads and
+    writes. Writes to the base layer, which happen when there is no layer,
+    evict least recently used keys until capacity is met. Writes in layers
+    don't evict anything, so keys created in layers and values backed up in
+    layers are never lost.
+
+    >>> from wardrobe import LRUStackedDict
+    >>> s = LRUStackedDict()
+    >>> s.capacity = 2
+    >>> s.update(a=1)
+    >>> s['b'] = 2
+    >>> s['a']
+    1
+    >>> s['c'] = 3  # Evicts 'b', the least recently used key.
+    >>> sorted(s.keys())
+    ['a', 'c']
+    >>> s.evictions
+    1
+
+    Reads with ``[]`` or :py:meth:`get` count hits and misses.
+
+    >>> s.get('b')
+    >>> (s.hits, s.misses)
+    (1, 1)
+
+    Layers work as usual on top of the base layer.
+
+    >>> s.commit().update(a='A', d=4, e=5)
+    >>> len(s)
+    4
+    >>> dict(s.reset()) == {'a': 1, 'c': 3}
+    True
+
+    """
+    #: Maximum number of keys in the base layer, or ``None``.
+    capacity = None
+
+    def __init__(self, initial=None, **kwargs):
+        super(LRUStackedDict, self).__init__(initial, **kwargs)
+        self._order = OrderedDict.fromkeys(self._dict)  # Keys of base layer,
+                                                        # least recent first.
+        #: Number of reads of existing keys.
+        self.hits = 0
+        #: Number of reads of missing keys.
+        self.misses = 0
+        #: Number of keys evicted.
+        self.evictions = 0
+        self._evict()
+
+    def __copy__(self):
+        duplicate = super(LRUStackedDict, self).__copy__()
+        duplicate._order = OrderedDict(self._order)
+        return duplicate
+
+    def _touch(self, key):
+        """Mark key of base layer as most recently used."""
+        order = self._order
+        if key in order:
+            del order[key]
+            order[key] = None
+
+    def _evict(self):
+        """Evict least recently used keys of base layer beyond capacity.
+
+        Must only be called when there is no layer.
+
+        """
+        if self.capacity is None:
+            return
+        order = self._order
+        while len(order) > self.capacity:
+            key = order.popitem(last=False)[0]
+            del self._dict[key]
+            self.evictions += 1
+
+    def __getitem__(self, key):
+        try:
+            value = self._dict[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        self._touch(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super(LRUStackedDict, self).__setitem__(key, value)
+        if not self._has_layers():
+            self._touch(key)
+            if key not in self._order:
+                self._order[key] = None
+                self._evict()
+
+    def __delitem__(self, key):
+        super(LRUStackedDict, self).__delitem__(key)
+        if not self._has_layers():
+            del self._order[key]
+
+    def clear(self):
+        super(LRUStackedDict, self).clear()
+        if not self._has_layers():
+            self._order.clear()
+
+    def pop(self, key, *args):
+        has_key = key in self._dict
+        value = super(LRUStackedDict, self).pop(key, *args)
+        if has_key and not self._has_layers():
+            del self._order[key]
+        return value
+
+    def popitem(self):
+        key, value = super(LRUStackedDict, self).popitem()
+        if not self._has_layers():
+            del self._order[key]
+        return key, value
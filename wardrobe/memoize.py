@@ -0,0 +1,189 @@
+"""Memoization of values derived from StackedDict instances."""
+from collections import namedtuple, OrderedDict
+from functools import wraps
+
+
+#: Marker for keys that were missing when read.
+_MISSING = object()
+
+
+#: Statistics returned by ``cache_info()`` of memoized functions.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+def _raw_get(mapping, key):
+    """Return value stored for key in mapping, without any wrapping."""
+    try:
+        return mapping._dict.get(key, _MISSING)
+    except AttributeError:
+        return mapping.get(key, _MISSING)
+
+
+class _Recorder(object):
+    """Read-only view of a mapping which records the keys it reads."""
+    def __init__(self, mapping):
+        self._mapping = mapping
+        self.reads = {}  # Key => value read, or _MISSING.
+        self.length = None  # Length of mapping, if the key set was read.
+
+    def _read(self, key):
+        self.reads[key] = _raw_get(self._mapping, key)
+
+    def __getitem__(self, key):
+        self._read(key)
+        return self._mapping[key]
+
+    def get(self, key, default=None):
+        self._read(key)
+        return self._mapping.get(key, default)
+
+    def __contains__(self, key):
+        self._read(key)
+        return key in self._mapping
+
+    has_key = __contains__
+
+    def __len__(self):
+        self.length = len(self._mapping)
+        return self.length
+
+    def __iter__(self):
+        self.length = len(self._mapping)
+        for key in self._mapping:
+            self._read(key)
+            yield key
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return list(self.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def iterkeys(self):
+        return iter(self)
+
+    def iteritems(self):
+        for key in self:
+            yield key, self._mapping[key]
+
+    def itervalues(self):
+        for key in self:
+            yield self._mapping[key]
+
+    def is_valid(self, mapping):
+        """Return True if keys read from mapping still hold the same
+        values."""
+        if self.length is not None and self.length != len(mapping):
+            return False
+        for key, value in self.reads.iteritems():
+            if _raw_get(mapping, key) is not value:
+                return False
+        return True
+
+
+def memoize(maxsize=128):
+    """Return decorator which caches results of a function whose first
+    argument is a StackedDict.
+
+    The decorated function receives a read-only view of the StackedDict,
+    which records the keys the function reads. A cached result is reused as
+    long as those keys hold the same values, i.e. none of them was written,
+    deleted, or restored to another value by ``reset()``. Checking a cached
+    result costs the number of keys that were read.
+
+    Other arguments must be hashable. At most ``maxsize`` results are cached,
+    least recently used ones are evicted first. ``None`` means no limit.
+
+    >>> from wardrobe import StackedDict
+    >>> from wardrobe.memoize import memoize
+    >>> @memoize(maxsize=10)
+    ... def full_name(context, title=''):
+    ...     print('Computing...')
+    ...     return '%s%s %s' % (title, context['first'], context['last'])
+    >>> s = StackedDict(first='Clark', last='Kent', job='journalist')
+    >>> full_name(s)
+    Computing...
+    'Clark Kent'
+    >>> s['job'] = 'superhero'
+    >>> full_name(s)
+    'Clark Kent'
+    >>> s.commit()['first'] = 'Kal'
+    >>> full_name(s)
+    Computing...
+    'Kal Kent'
+    >>> full_name(s.reset())
+    Computing...
+    'Clark Kent'
+    >>> full_name.cache_info()
+    CacheInfo(hits=1, misses=3, maxsize=10, currsize=1)
+
+    Iterating over the view reads all keys, and their number:
+
+    >>> @memoize()
+    ... def total(context):
+    ...     print('Computing...')
+    ...     return sum(value for key, value in context.iteritems())
+    >>> s = StackedDict(a=1, b=2)
+    >>> total(s)
+    Computing...
+    3
+    >>> total(s.commit())
+    3
+    >>> s['c'] = 3
+    >>> total(s)
+    Computing...
+    6
+
+    .. note::
+
+       In-place mutations of values aren't detected, unless they replace the
+       value, as :py:class:`wardrobe.copyonwrite.CopyOnWriteStackedDict` does
+       in layers.
+
+    .. note::
+
+       Cached results keep a reference to the StackedDict they were computed
+       from, until they are evicted.
+
+    """
+    def decorator(function):
+        cache = OrderedDict()  # Key => (mapping, recorder, result).
+        statistics = {'hits': 0, 'misses': 0}
+
+        @wraps(function)
+        def wrapper(mapping, *args, **kwargs):
+            key = (id(mapping), args, frozenset(kwargs.iteritems()))
+            try:
+                cached_mapping, recorder, result = cache.pop(key)
+            except KeyError:
+                pass
+            else:
+                if cached_mapping is mapping and recorder.is_valid(mapping):
+                    cache[key] = (mapping, recorder, result)
+                    statistics['hits'] += 1
+                    return result
+            statistics['misses'] += 1
+            recorder = _Recorder(mapping)
+            result = function(recorder, *args, **kwargs)
+            cache[key] = (mapping, recorder, result)
+            if maxsize is not None and len(cache) > maxsize:
+                cache.popitem(last=False)
+            return result
+
+        def cache_info():
+            """Return hits, misses, maxsize and current size of cache."""
+            return CacheInfo(statistics['hits'], statistics['misses'],
+                             maxsize, len(cache))
+
+        def cache_clear():
+            """Clear cache and statistics."""
+            cache.clear()
+            statistics.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
@@ -0,0 +1,96 @@
+"""StackedDict variant which notifies changes of its items."""
+from wardrobe.stackeddict import StackedDict
+
+
+#: Marker for missing values in change notifications.
+MISSING = object()
+
+
+class ObservableStackedDict(StackedDict):
+    """StackedDict which notifies every change of an item.
+
+    Changes made by writes, deletions and :py:meth:`reset` are all notified,
+    as ``(key, old_value, new_value)``, where a missing value is
+    :py:data:`MISSING`. Subclasses override :py:meth:`_changed`, other code
+    registers callables with :py:meth:`add_observer`.
+
+    >>> from wardrobe import ObservableStackedDict
+    >>> from wardrobe.observable import MISSING
+    >>> def log(key, old_value, new_value):
+    ...     print('%s: %s => %s' % (key,
+    ...                             'MISSING' if old_value is MISSING
+    ...                             else old_value,
+    ...                             'MISSING' if new_value is MISSING
+    ...                             else new_value))
+    >>> s = ObservableStackedDict(a=1)
+    >>> s.add_observer(log)
+    >>> s.commit().update(a=2)
+    a: 1 => 2
+    >>> del s['a']
+    a: 2 => MISSING
+    >>> silent = s.reset()
+    a: MISSING => 1
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(ObservableStackedDict, self).__init__(initial, **kwargs)
+        self._observers = []
+
+    def __copy__(self):
+        """Copy operator. Observers are not copied."""
+        duplicate = super(ObservableStackedDict, self).__copy__()
+        duplicate._observers = []
+        return duplicate
+
+    def add_observer(self, observer):
+        """Register callable ``observer(key, old_value, new_value)``."""
+        self._observers.append(observer)
+
+    def remove_observer(self, observer):
+        """Unregister observer."""
+        self._observers.remove(observer)
+
+    def _changed(self, key, old_value, new_value):
+        """Notify change of key to observers."""
+        for observer in self._observers:
+            observer(key, old_value, new_value)
+
+    def __setitem__(self, key, value):
+        old_value = self._dict.get(key, MISSING)
+        super(ObservableStackedDict, self).__setitem__(key, value)
+        self._changed(key, old_value, value)
+
+    def __delitem__(self, key):
+        old_value = self._dict.get(key, MISSING)
+        super(ObservableStackedDict, self).__delitem__(key)
+        self._changed(key, old_value, MISSING)
+
+    def clear(self):
+        items = self._dict.items()
+        super(ObservableStackedDict, self).clear()
+        for key, value in items:
+            self._changed(key, value, MISSING)
+
+    def pop(self, key, *args):
+        if key not in self._dict:
+            return super(ObservableStackedDict, self).pop(key, *args)
+        value = super(ObservableStackedDict, self).pop(key)
+        self._changed(key, value, MISSING)
+        return value
+
+    def popitem(self):
+        key, value = super(ObservableStackedDict, self).popitem()
+        self._changed(key, value, MISSING)
+        return key, value
+
+    def reset(self, redo=False):
+        if not self._has_layers():
+            return super(ObservableStackedDict, self).reset(redo)
+        keys = self._created[0].union(self._overriden[0])
+        old_items = [(key, self._dict.get(key, MISSING)) for key in keys]
+        super(ObservableStackedDict, self).reset(redo)
+        for key, old_value in old_items:
+            new_value = self._dict.get(key, MISSING)
+            if new_value is not old_value:
+                self._changed(key, old_value, new_value)
+        return self
@@ -0,0 +1,214 @@
+"""Per-key access profiling of StackedDict instances."""
+from heapq import heappop, heappush
+from itertools import count as counter
+from random import random
+
+
+class TopCounter(object):
+    """Counter which keeps at most ``size`` keys, the most frequent ones.
+
+    Implements the Space-Saving algorithm: when the counter is full, a new key
+    replaces the key with the lowest count, and inherits that count. So
+    counts are upper bounds, and any key counted more than ``total / size``
+    times is kept. Keys are kept in a heap by count, which is updated lazily
+    at eviction, so that adding costs O(log size) amortized time.
+
+    >>> from wardrobe.profiler import TopCounter
+    >>> counter = TopCounter(2)
+    >>> for key in 'aabacaadd':
+    ...     counter.add(key)
+    >>> counter.most_common()
+    [('a', 5), ('d', 4)]
+    >>> counter.total
+    9
+
+    """
+    def __init__(self, size):
+        self.size = size
+        self.counts = {}
+        #: Sum of all counts added.
+        self.total = 0
+        # (count, insertion order, key) of each key. Counts may be lower than
+        # actual ones, since they are only updated when popped.
+        self._heap = []
+        self._order = counter()
+
+    def add(self, key, count=1):
+        """Add count to key."""
+        counts = self.counts
+        self.total += count
+        try:
+            counts[key] += count
+        except KeyError:
+            heap = self._heap
+            if len(counts) < self.size:
+                counts[key] = count
+            else:
+                while True:
+                    heap_count, order, evicted = heappop(heap)
+                    actual = counts[evicted]
+                    if actual == heap_count:
+                        break
+                    heappush(heap, (actual, order, evicted))
+                del counts[evicted]
+                count += actual
+                counts[key] = count
+            heappush(heap, (count, next(self._order), key))
+
+    def most_common(self, n=None):
+        """Return list of the n most frequent (key, count) pairs."""
+        items = sorted(self.counts.iteritems(), key=lambda item: -item[1])
+        if n is None:
+            return items
+        return items[:n]
+
+
+#: Profiled subclass of each class, created on demand.
+_profiled_classes = {}
+
+
+def _backup_count(stackeddict):
+    """Return number of values backed up in current layer, or 0 if the
+    dictionary doesn't record backups in ``_overriden``."""
+    try:
+        return len(stackeddict._overriden[0])
+    except (AttributeError, IndexError):
+        return 0
+
+
+def _profiled_class(cls):
+    """Return subclass of cls which reports accesses to ``_key_profiler``."""
+    try:
+        return _profiled_classes[cls]
+    except KeyError:
+        pass
+
+    class Profiled(cls):
+        def __copy__(self):
+            """Copy operator. Copies are not profiled."""
+            duplicate = cls.__copy__(self)
+            duplicate.__class__ = cls
+            del duplicate._key_profiler
+            return duplicate
+
+        def __getitem__(self, key):
+            try:
+                value = cls.__getitem__(self, key)
+            except KeyError:
+                self._key_profiler._record(self._key_profiler.misses, key)
+                raise
+            self._key_profiler._record(self._key_profiler.reads, key)
+            return value
+
+        def __setitem__(self, key, value):
+            backups = _backup_count(self)
+            cls.__setitem__(self, key, value)
+            self._key_profiler._record_write(key, backups)
+
+        def __delitem__(self, key):
+            backups = _backup_count(self)
+            cls.__delitem__(self, key)
+            self._key_profiler._record_write(key, backups)
+
+        def pop(self, key, *args):
+            backups = _backup_count(self)
+            has_key = key in self
+            value = cls.pop(self, key, *args)
+            if has_key:
+                self._key_profiler._record_write(key, backups)
+            return value
+
+    Profiled.__name__ = cls.__name__
+    Profiled.__module__ = cls.__module__
+    _profiled_classes[cls] = Profiled
+    return Profiled
+
+
+class KeyProfiler(object):
+    """Profiler of reads, misses, writes and backups of each key of a
+    StackedDict.
+
+    The profiler attaches to the instance by switching its class to a
+    profiled subclass, until :py:meth:`close`. Only the ``size`` most
+    frequent keys of each kind of access are kept, see
+    :py:class:`TopCounter`. With ``sampling=n``, accesses are recorded at
+    random with probability 1/n, and counted n times.
+
+    Reads and misses are counted by ``[]``, which ``get()`` and
+    ``setdefault()`` use. Writes are counted by ``[]``, ``del`` and
+    :py:meth:`pop`. Backups count writes which backed up a value in the
+    current layer, i.e. keys overriden in layers.
+
+    >>> from wardrobe import StackedDict
+    >>> from wardrobe.profiler import KeyProfiler
+    >>> s = StackedDict(config='default', user='clark')
+    >>> profiler = KeyProfiler(s)
+    >>> for request in range(3):
+    ...     s.commit()['user'] = s['config'] + str(request)
+    ...     s.get('session')
+    ...     silent = s.reset()
+    >>> print(profiler.report(n=1))
+    Reads: 3, misses: 3 (50.0%), writes: 3, backups: 3.
+    Most read: 3 'config'
+    Most missed: 3 'session'
+    Most written: 3 'user'
+    Most backed up: 3 'user'
+    >>> profiler.close()
+
+    """
+    def __init__(self, stackeddict, size=100, sampling=1):
+        #: Counter of reads of existing keys.
+        self.reads = TopCounter(size)
+        #: Counter of reads of missing keys.
+        self.misses = TopCounter(size)
+        #: Counter of writes and deletions.
+        self.writes = TopCounter(size)
+        #: Counter of writes which backed up a value.
+        self.backups = TopCounter(size)
+        self.sampling = sampling
+        self._class = stackeddict.__class__
+        stackeddict._key_profiler = self
+        stackeddict.__class__ = _profiled_class(self._class)
+        self._stackeddict = stackeddict
+
+    def _sampled(self):
+        """Return True if current access should be recorded."""
+        return self.sampling == 1 or random() * self.sampling < 1
+
+    def _record(self, counter, key):
+        if self._sampled():
+            counter.add(key, self.sampling)
+
+    def _record_write(self, key, backups):
+        if self._sampled():
+            self.writes.add(key, self.sampling)
+            if _backup_count(self._stackeddict) > backups:
+                self.backups.add(key, self.sampling)
+
+    @property
+    def miss_rate(self):
+        """Ratio of reads of missing keys, among all reads."""
+        total = self.reads.total + self.misses.total
+        if not total:
+            return 0.0
+        return float(self.misses.total) / total
+
+    def report(self, n=10):
+        """Return text report of totals and of the n most accessed keys."""
+        lines = ['Reads: %d, misses: %d (%.1f%%), writes: %d, backups: %d.'
+                 % (self.reads.total, self.misses.total,
+                    self.miss_rate * 100, self.writes.total,
+                    self.backups.total)]
+        for title, counter in [('read', self.reads),
+                               ('missed', self.misses),
+                               ('written', self.writes),
+                               ('backed up', self.backups)]:
+            for key, count in counter.most_common(n):
+                lines.append('Most %s: %d %r' % (title, count, key))
+        return '\n'.join(lines)
+
+    def close(self):
+        """Stop profiling."""
+        stackeddict = self._stackeddict
+        stackeddict.__class__ = self._class
+        del stackeddict._key_profiler
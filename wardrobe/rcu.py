@@ -0,0 +1,116 @@
+"""StackedDict variant with lock-free readers, in read-copy-update style."""
+from wardrobe.stackeddict import StackedDict
+
+
+class RCUStackedDict(StackedDict):
+    """StackedDict shared by one writer thread and lock-free reader threads.
+
+    Readers read a published dict. Writes of single items are applied to it
+    in place, which is atomic. Operations which change several items,
+    :py:meth:`reset`, :py:meth:`redo`, :py:meth:`update` and
+    :py:meth:`clear`, work on a private copy, then publish it with a
+    reference swap. So readers never see a partially reset layer.
+
+    >>> from wardrobe import RCUStackedDict
+    >>> s = RCUStackedDict(a=1, b=2)
+    >>> published = s.published
+    >>> s.commit().update(a='A', c=3)
+    >>> s.published is published
+    False
+    >>> published == {'a': 1, 'b': 2}
+    True
+    >>> dict(s.reset()) == published
+    True
+
+    Multi-item operations cost a copy of the dictionary: this variant suits
+    workloads where reads are much more frequent than resets.
+
+    Each read method reads one published dict, so its result is consistent,
+    but successive reads may see different dicts. Iterators and views are
+    bound to a copy of the dict published when they were created, since
+    writes of single items change the published dict in place.
+
+    >>> keys = s.viewkeys()
+    >>> s['d'] = 4
+    >>> sorted(keys)
+    ['a', 'b']
+
+    There must be only one writer, or writers must synchronize themselves.
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(RCUStackedDict, self).__init__(initial, **kwargs)
+        self._published = self._dict
+
+    def __copy__(self):
+        duplicate = super(RCUStackedDict, self).__copy__()
+        duplicate._published = duplicate._dict
+        return duplicate
+
+    @property
+    def published(self):
+        """Dict currently read by readers. Must not be modified."""
+        return self._published
+
+    def _copy_update(self, method, *args, **kwargs):
+        """Call method on a private copy of values, then publish it."""
+        self._dict = dict(self._published)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._published = self._dict
+
+    def update(self, *args, **kwargs):
+        self._copy_update(super(RCUStackedDict, self).update, *args, **kwargs)
+
+    def clear(self):
+        self._copy_update(super(RCUStackedDict, self).clear)
+
+    def reset(self, redo=False):
+        if not self._has_layers():
+            return super(RCUStackedDict, self).reset(redo)
+        return self._copy_update(super(RCUStackedDict, self).reset, redo)
+
+    def redo(self):
+        if not self._redo:
+            return super(RCUStackedDict, self).redo()
+        return self._copy_update(super(RCUStackedDict, self).redo)
+
+    def __len__(self):
+        return len(self._published)
+
+    def __getitem__(self, key):
+        return self._published[key]
+
+    def get(self, key, default=None):
+        return self._published.get(key, default)
+
+    def has_key(self, key):
+        return key in self._published
+
+    def keys(self):
+        return self._published.keys()
+
+    def values(self):
+        return self._published.values()
+
+    def items(self):
+        return self._published.items()
+
+    def iterkeys(self):
+        return iter(self._published.keys())
+
+    def itervalues(self):
+        return iter(self._published.values())
+
+    def iteritems(self):
+        return iter(self._published.items())
+
+    def viewkeys(self):
+        return dict(self._published).viewkeys()
+
+    def viewvalues(self):
+        return dict(self._published).viewvalues()
+
+    def viewitems(self):
+        return dict(self._published).viewitems()
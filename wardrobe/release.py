@@ -0,0 +1,125 @@
+"""StackedDict variant which releases discarded values in the background."""
+from Queue import Full, Queue
+from threading import Lock, Thread
+
+from wardrobe.stackeddict import StackedDict
+
+
+class Releaser(object):
+    """Queue of objects to be freed off the caller's path.
+
+    With ``background=True``, a daemon thread, started on first use, drops
+    the references to queued objects, so that their deallocation happens in
+    that thread. Otherwise, objects wait in the queue until :py:meth:`drain`
+    is called, e.g. when the program is idle.
+
+    At most ``max_size`` batches wait in the queue. When it is full,
+    :py:meth:`release` drops its batch immediately, which caps memory.
+
+    >>> from wardrobe.release import Releaser
+    >>> releaser = Releaser(max_size=1, background=False)
+    >>> releaser.release(['some', 'objects'])
+    >>> releaser.pending
+    1
+    >>> releaser.release(['more', 'objects'])  # Queue is full.
+    >>> releaser.pending
+    1
+    >>> releaser.drain()
+    >>> releaser.pending
+    0
+
+    """
+    def __init__(self, max_size=100, background=True):
+        self.background = background
+        self._queue = Queue(max_size)
+        self._lock = Lock()
+        self._thread = None
+
+    @property
+    def pending(self):
+        """Approximate number of batches waiting to be freed."""
+        return self._queue.qsize()
+
+    def release(self, batch):
+        """Queue batch of objects to be freed."""
+        if self.background and self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(batch)
+        except Full:
+            pass  # batch is freed when this method returns.
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self):
+        """Free queued batches, forever."""
+        queue = self._queue
+        while True:
+            batch = queue.get()
+            batch = None  # Free batch here, in this thread.
+            queue.task_done()
+
+    def drain(self):
+        """Free all queued batches in the calling thread, or, with a
+        background thread, wait until it has freed them."""
+        if self._thread is not None:
+            self._queue.join()
+            return
+        queue = self._queue
+        while not queue.empty():
+            queue.get_nowait()
+            queue.task_done()
+
+
+#: Releaser shared by instances of DeferredReleaseStackedDict.
+default_releaser = Releaser()
+
+
+class DeferredReleaseStackedDict(StackedDict):
+    """StackedDict whose :py:meth:`reset` hands discarded values over to a
+    :py:class:`Releaser`, so that they are not freed inline.
+
+    Values of keys created in the dropped layer and values overriding
+    backups are discarded by :py:meth:`reset`, as well as all values by
+    :py:meth:`clear` without layers. Large values can take long to
+    deallocate: they are passed to :py:attr:`releaser` instead.
+
+    >>> from wardrobe import DeferredReleaseStackedDict
+    >>> from wardrobe.release import Releaser
+    >>> s = DeferredReleaseStackedDict(a=1)
+    >>> s.releaser = Releaser(background=False)
+    >>> s.commit().update(a=range(1000), b=range(1000))
+    >>> dict(s.reset())
+    {'a': 1}
+    >>> s.releaser.pending
+    1
+    >>> s.releaser.drain()
+
+    """
+    #: :py:class:`Releaser` of discarded values. Defaults to one shared
+    #: releaser with a background thread.
+    releaser = default_releaser
+
+    def reset(self, redo=False):
+        if not self._has_layers():
+            return super(DeferredReleaseStackedDict, self).reset(redo)
+        values = self._dict
+        batch = [values[key] for key in self._created[0]]
+        batch.extend(values[key] for key in self._overriden[0]
+                     if key in values)
+        batch.append(self._created[0])
+        super(DeferredReleaseStackedDict, self).reset(redo)
+        self.releaser.release(batch)
+        return self
+
+    def clear(self):
+        if self._has_layers():
+            return super(DeferredReleaseStackedDict, self).clear()
+        batch = self._dict.values()
+        super(DeferredReleaseStackedDict, self).clear()
+        self.releaser.release(batch)
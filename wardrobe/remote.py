@@ -0,0 +1,515 @@
+"""StackedDict variant whose base layer lives in a remote key-value store."""
+from contextlib import contextmanager
+import cPickle
+from itertools import izip
+from Queue import Empty, LifoQueue
+import re
+import socket
+from threading import Lock
+
+from wardrobe.stackeddict import StackedDict
+
+
+#: Marker returned by backends for missing keys.
+MISSING = object()
+
+#: Characters to escape in SCAN patterns.
+_GLOB_SPECIAL = re.compile(r'[*?[\]\\]')
+
+
+class RemoteError(Exception):
+    """Error reply of a remote server."""
+
+
+class DictBackend(object):
+    """In-memory backend, a stand-in for remote stores in tests.
+
+    Counts calls in :py:attr:`requests`, i.e. round trips a remote backend
+    would make.
+
+    """
+    def __init__(self, initial=None):
+        self.data = dict(initial or {})
+        self.requests = 0
+
+    def get_many(self, keys):
+        """Return list of values of keys, :py:data:`MISSING` for missing
+        keys."""
+        self.requests += 1
+        get = self.data.get
+        return [get(key, MISSING) for key in keys]
+
+    def set_many(self, items):
+        """Store (key, value) items."""
+        self.requests += 1
+        self.data.update(items)
+
+    def delete(self, keys):
+        """Remove keys, ignoring missing ones."""
+        self.requests += 1
+        for key in keys:
+            self.data.pop(key, None)
+
+    def keys(self):
+        """Return list of all keys."""
+        self.requests += 1
+        return self.data.keys()
+
+
+class Connection(object):
+    r"""Connection to a server speaking the Redis protocol (RESP), over a
+    connected socket.
+
+    Error replies to pipelined commands are raised once all replies have
+    been read, so that the connection stays in sync with the server. Here,
+    the other end of a socket pair stands in for the server:
+
+    >>> import socket
+    >>> from wardrobe.remote import Connection
+    >>> client, server = socket.socketpair()
+    >>> connection = Connection(client)
+    >>> server.sendall('-WRONGTYPE wrong kind of value\r\n'
+    ...                '$2\r\nk2\r\n$1\r\nx\r\n')
+    >>> connection.execute_many([['GET', 'bad'], ['GET', 'k2']])
+    Traceback (most recent call last):
+    ...
+    RemoteError: WRONGTYPE wrong kind of value
+    >>> connection.execute_many([['GET', 'x']])
+    ['x']
+    >>> connection.close()
+    >>> server.close()
+
+    """
+    def __init__(self, connected_socket):
+        self._socket = connected_socket
+        self._file = connected_socket.makefile('rb')
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def execute_many(self, commands):
+        """Send commands at once, then return list of their replies.
+
+        Pipelining commands costs one round trip instead of one per command.
+        Raises :py:class:`RemoteError` for the first error reply.
+
+        """
+        chunks = []
+        for command in commands:
+            chunks.append('*%d\r\n' % len(command))
+            for argument in command:
+                argument = str(argument)
+                chunks.append('$%d\r\n%s\r\n' % (len(argument), argument))
+        self._socket.sendall(''.join(chunks))
+        replies = [self._read_reply() for command in commands]
+        for reply in replies:
+            if isinstance(reply, RemoteError):
+                raise reply
+        return replies
+
+    def _read_reply(self):
+        """Read one reply. Error replies are returned as
+        :py:class:`RemoteError` instances, not raised."""
+        line = self._file.readline()
+        if not line.endswith('\r\n'):
+            raise socket.error('Connection closed by server')
+        kind, data = line[0], line[1:-2]
+        if kind == '+':
+            return data
+        if kind == '-':
+            return RemoteError(data)
+        if kind == ':':
+            return int(data)
+        if kind == '$':
+            size = int(data)
+            if size < 0:
+                return None
+            return self._file.read(size + 2)[:-2]
+        if kind == '*':
+            size = int(data)
+            if size < 0:
+                return None
+            return [self._read_reply() for index in xrange(size)]
+        raise socket.error('Unknown reply: %r' % line)
+
+
+class ConnectionPool(object):
+    """Thread-safe pool of at most ``size`` connections, opened on demand
+    with ``factory()``."""
+    def __init__(self, factory, size=4):
+        self.factory = factory
+        self.size = size
+        self._idle = LifoQueue()
+        self._opened = 0
+        self._lock = Lock()
+
+    @contextmanager
+    def connection(self):
+        """Context manager which borrows a connection, waiting for one if
+        ``size`` connections are busy.
+
+        :py:class:`RemoteError` is raised once all replies have been read,
+        so the connection goes back to the pool. Connections which raise
+        other errors may be out of sync with the server, so they are closed
+        instead.
+
+        """
+        try:
+            connection = self._idle.get_nowait()
+        except Empty:
+            with self._lock:
+                opening = self._opened < self.size
+                if opening:
+                    self._opened += 1
+            if opening:
+                try:
+                    connection = self.factory()
+                except:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                connection = self._idle.get()
+        try:
+            yield connection
+        except RemoteError:
+            self._idle.put(connection)
+            raise
+        except:
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+            raise
+        self._idle.put(connection)
+
+    def close(self):
+        """Close idle connections."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except Empty:
+                return
+            connection.close()
+            with self._lock:
+                self._opened -= 1
+
+
+class RedisBackend(object):
+    r"""Backend for servers speaking the Redis protocol.
+
+    The backend stores keys in a namespace: server keys are prefixed with
+    ``prefix``, and :py:meth:`keys` only scans keys with that prefix, so
+    that other data of the server is neither listed nor deleted.
+
+    Keys must be strings. Values are pickled. Requests are split in batches
+    of at most :py:attr:`batch_size` keys, which are pipelined on one
+    connection of the pool. Here, the other end of a socket pair stands in
+    for the server:
+
+    >>> import socket
+    >>> from wardrobe.remote import Connection, MISSING, RedisBackend
+    >>> backend = RedisBackend(prefix='app:')
+    >>> client, server = socket.socketpair()
+    >>> backend.pool.factory = lambda: Connection(client)
+    >>> server.sendall('*2\r\n$-1\r\n$-1\r\n')
+    >>> backend.get_many(['a', 'b']) == [MISSING, MISSING]
+    True
+    >>> server.recv(1024)
+    '*3\r\n$4\r\nMGET\r\n$5\r\napp:a\r\n$5\r\napp:b\r\n'
+    >>> backend.close()
+    >>> server.close()
+
+    """
+    #: Maximum number of keys per command.
+    batch_size = 1000
+
+    def __init__(self, host='localhost', port=6379, prefix='wardrobe:',
+                 pool_size=4, timeout=None):
+        self.prefix = prefix
+        self.pool = ConnectionPool(
+            lambda: Connection(socket.create_connection((host, port),
+                                                        timeout)),
+            pool_size)
+
+    def _batches(self, sequence, size):
+        return [sequence[index:index + size]
+                for index in xrange(0, len(sequence), size)]
+
+    def _execute_many(self, commands):
+        with self.pool.connection() as connection:
+            return connection.execute_many(commands)
+
+    def get_many(self, keys):
+        """Return list of values of keys, :py:data:`MISSING` for missing
+        keys."""
+        prefix = self.prefix
+        keys = [prefix + key for key in keys]
+        if not keys:
+            return []
+        batches = self._batches(keys, self.batch_size)
+        values = []
+        for replies in self._execute_many([['MGET'] + batch
+                                           for batch in batches]):
+            values.extend(MISSING if reply is None else cPickle.loads(reply)
+                          for reply in replies)
+        return values
+
+    def set_many(self, items):
+        """Store (key, value) items."""
+        prefix = self.prefix
+        arguments = []
+        for key, value in items:
+            arguments.append(prefix + key)
+            arguments.append(cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL))
+        if arguments:
+            batches = self._batches(arguments, 2 * self.batch_size)
+            self._execute_many([['MSET'] + batch for batch in batches])
+
+    def delete(self, keys):
+        """Remove keys, ignoring missing ones."""
+        prefix = self.prefix
+        keys = [prefix + key for key in keys]
+        if keys:
+            batches = self._batches(keys, self.batch_size)
+            self._execute_many([['DEL'] + batch for batch in batches])
+
+    def keys(self):
+        """Return list of keys of the namespace, scanned in batches."""
+        prefix = self.prefix
+        pattern = _GLOB_SPECIAL.sub(r'\\\g<0>', prefix) + '*'
+        keys = set()
+        cursor = '0'
+        with self.pool.connection() as connection:
+            while True:
+                [(cursor, batch)] = connection.execute_many(
+                    [['SCAN', cursor, 'MATCH', pattern,
+                      'COUNT', self.batch_size]])
+                keys.update(key[len(prefix):] for key in batch)
+                if cursor == '0':
+                    return list(keys)
+
+    def close(self):
+        """Close idle connections of the pool."""
+        self.pool.close()
+
+
+class RemoteStackedDict(StackedDict):
+    """StackedDict whose base layer is stored in a backend, such as
+    :py:class:`RedisBackend`.
+
+    Base values are fetched on first read and cached locally, so layers work
+    as usual: :py:meth:`commit` and :py:meth:`reset` never reach the backend.
+    Changes made without layers are written through to the backend,
+    including ``initial`` items and keyword arguments of the constructor,
+    and :py:meth:`clear`, which deletes all keys of the backend.
+    Changes made in layers stay local; keys they touch are fetched first, so
+    that their base values are backed up.
+
+    :py:meth:`get_many` and :py:meth:`update` fetch missing keys in one
+    request. Iteration, :py:func:`len` and :py:meth:`clear` fetch the whole
+    base layer once.
+
+    >>> from wardrobe import RemoteStackedDict
+    >>> from wardrobe.remote import DictBackend
+    >>> backend = DictBackend({'top': 'blue', 'bottom': 'red'})
+    >>> s = RemoteStackedDict(backend)
+    >>> s.get_many(['top', 'bottom', 'cape'])
+    ['blue', 'red', None]
+    >>> s['top'], backend.requests  # Cached.
+    ('blue', 1)
+    >>> s.commit().update(top='white', cape='red')
+    >>> del s['bottom']
+    >>> sorted(s.items())
+    [('cape', 'red'), ('top', 'white')]
+    >>> sorted(s.reset().items())
+    [('bottom', 'red'), ('top', 'blue')]
+    >>> s['cape'] = 'green'  # Without layers: written through.
+    >>> backend.data['cape']
+    'green'
+
+    Cached values are not notified of changes made by other clients of the
+    backend. :py:meth:`invalidate` drops them.
+
+    """
+    def __init__(self, backend, initial=None, **kwargs):
+        super(RemoteStackedDict, self).__init__()
+        self.backend = backend
+        self._fetched = set()  # Keys whose base value is cached.
+        self._complete = False  # Whether the whole base layer is cached.
+        if initial or kwargs:
+            self.update(initial or {}, **kwargs)
+
+    def __copy__(self):
+        """Copy operator. The copy shares the backend, not the cache."""
+        duplicate = super(RemoteStackedDict, self).__copy__()
+        duplicate._fetched = set(self._fetched)
+        return duplicate
+
+    @classmethod
+    def fromkeys(cls, backend, seq, value=None):
+        """Create a new RemoteStackedDict on backend, with keys from seq and
+        values set to value, written to the backend."""
+        return cls(backend, dict.fromkeys(seq, value))
+
+    @classmethod
+    def from_layers(cls, backend, layers):
+        """Create a new RemoteStackedDict on backend from an iterable of
+        mappings: the first one is written to the backend, each other one is
+        a layer on top of the previous ones.
+
+        >>> backend = DictBackend()
+        >>> s = RemoteStackedDict.from_layers(backend, [{'a': 1}, {'a': 2}])
+        >>> s['a'], backend.data
+        (2, {'a': 1})
+        >>> s.reset()['a']
+        1
+
+        """
+        layers = iter(layers)
+        instance = cls(backend, next(layers, None))
+        for layer in layers:
+            instance.commit().update(layer)
+        return instance
+
+    def _fetch(self, keys):
+        """Cache base values of keys, in one request."""
+        if self._complete:
+            return
+        fetched = self._fetched
+        keys = [key for key in set(keys) if key not in fetched]
+        if not keys:
+            return
+        values = self._dict
+        for key, value in izip(keys, self.backend.get_many(keys)):
+            if value is not MISSING:
+                values[key] = value
+        fetched.update(keys)
+
+    def _fetch_all(self):
+        """Cache the whole base layer."""
+        if not self._complete:
+            self._fetch(self.backend.keys())
+            self._complete = True
+            self._fetched = set()
+
+    def invalidate(self):
+        """Drop cached values, so that they are fetched again. Must be
+        called without layers."""
+        if self._has_layers():
+            raise ValueError('Cannot invalidate cache with layers')
+        self._dict.clear()
+        self._fetched = set()
+        self._complete = False
+        self._redo = []
+
+    def get_many(self, keys, default=None):
+        """Return list of values of keys, ``default`` for missing keys.
+
+        Fetches missing keys in one request.
+
+        """
+        keys = list(keys)
+        self._fetch(keys)
+        get = self._dict.get
+        return [get(key, default) for key in keys]
+
+    def __getitem__(self, key):
+        try:
+            return self._dict[key]
+        except KeyError:
+            self._fetch([key])
+            return self._dict[key]
+
+    def has_key(self, key):
+        if key not in self._dict:
+            self._fetch([key])
+        return key in self._dict
+
+    def __setitem__(self, key, value):
+        if self._has_layers():
+            self._fetch([key])
+        else:
+            self.backend.set_many([(key, value)])
+            self._fetched.add(key)
+        super(RemoteStackedDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._fetch([key])
+        if not self._has_layers() and key in self._dict:
+            self.backend.delete([key])
+        super(RemoteStackedDict, self).__delitem__(key)
+
+    def pop(self, key, *args):
+        self._fetch([key])
+        if not self._has_layers() and key in self._dict:
+            self.backend.delete([key])
+        return super(RemoteStackedDict, self).pop(key, *args)
+
+    def popitem(self):
+        if not self._dict:
+            self._fetch_all()
+        key, value = super(RemoteStackedDict, self).popitem()
+        if not self._has_layers():
+            self.backend.delete([key])
+        return key, value
+
+    def update(self, *args, **kwargs):
+        if len(args) > 1:
+            raise TypeError('update expected at most 1 arguments, got %d' \
+                            % len(args))
+        other = dict(*args, **kwargs)
+        if self._has_layers():
+            self._fetch(other)
+        else:
+            self.backend.set_many(other.iteritems())
+            self._fetched.update(other)
+        setitem = super(RemoteStackedDict, self).__setitem__
+        for key, value in other.iteritems():
+            setitem(key, value)
+
+    def clear(self):
+        self._fetch_all()
+        if not self._has_layers():
+            self.backend.delete(self._dict.keys())
+        super(RemoteStackedDict, self).clear()
+
+    def __len__(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).__len__()
+
+    def keys(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).keys()
+
+    def values(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).values()
+
+    def items(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).items()
+
+    def iterkeys(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).iterkeys()
+
+    def itervalues(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).itervalues()
+
+    def iteritems(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).iteritems()
+
+    def viewkeys(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).viewkeys()
+
+    def viewvalues(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).viewvalues()
+
+    def viewitems(self):
+        self._fetch_all()
+        return super(RemoteStackedDict, self).viewitems()
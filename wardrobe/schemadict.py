@@ -0,0 +1,358 @@
+"""StackedDict variant restricted to a fixed set of keys."""
+from array import array
+from collections import MutableMapping
+from copy import copy
+from itertools import izip
+
+from wardrobe.stackeddict import NoRevisionException
+
+
+#: Marker for empty slots.
+_MISSING = object()
+
+
+class Schema(object):
+    """Fixed sequence of keys, each of them mapped to an integer slot.
+
+    A schema is meant to be shared by many :py:class:`SchemaStackedDict`
+    instances.
+
+    >>> schema = Schema(['host', 'port', 'debug'])
+    >>> len(schema)
+    3
+    >>> schema.slots['port']
+    1
+    >>> 'user' in schema
+    False
+    >>> Schema(['host', 'host'])
+    Traceback (most recent call last):
+    ...
+    ValueError: Schema keys must be unique.
+
+    """
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self.slots = dict((key, slot) for slot, key in enumerate(self.keys))
+        if len(self.slots) != len(self.keys):
+            raise ValueError('Schema keys must be unique.')
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def __iter__(self):
+        return iter(self.keys)
+
+
+class SchemaStackedDict(MutableMapping):
+    """Dictionary-like object made of stacked layers, with keys restricted to
+    a :py:class:`Schema`.
+
+    Values are stored in a list, at the slot of their key. Each layer only
+    records (slot, old value) pairs in an undo log, so that :py:meth:`commit`
+    and :py:meth:`reset` work on integer arrays instead of dicts and sets.
+
+    >>> from wardrobe import SchemaStackedDict
+    >>> s = SchemaStackedDict(['host', 'port', 'debug'], host='localhost')
+    >>> s['host']
+    'localhost'
+    >>> s.commit()  # doctest: +ELLIPSIS
+    <wardrobe.schemadict.SchemaStackedDict object at 0x...>
+    >>> s.update(host='example.com', port=8080)
+    >>> dict(s) == {'host': 'example.com', 'port': 8080}
+    True
+    >>> s.reset()  # doctest: +ELLIPSIS
+    <wardrobe.schemadict.SchemaStackedDict object at 0x...>
+    >>> dict(s)
+    {'host': 'localhost'}
+
+    Keys that are not part of the schema cannot be set.
+
+    >>> s['user'] = 'clark'
+    Traceback (most recent call last):
+    ...
+    KeyError: 'user'
+
+    """
+    def __init__(self, schema, initial=None, **kwargs):
+        """Constructor.
+
+        ``schema`` is either a :py:class:`Schema` instance or an iterable of
+        keys.
+
+        >>> dict(SchemaStackedDict(['a', 'b']))
+        {}
+        >>> dict(SchemaStackedDict(['a', 'b'], {'a': 1}))
+        {'a': 1}
+        >>> dict(SchemaStackedDict(['a', 'b'], a=1))
+        {'a': 1}
+
+        """
+        if not isinstance(schema, Schema):
+            schema = Schema(schema)
+        if initial is None:
+            initial = kwargs
+        initial = dict(initial)
+        self._schema = schema
+        self._values = [_MISSING] * len(schema)  # Active values, by slot.
+        self._len = len(initial)
+        self._log_slots = array('l')  # Undo log: slots...
+        self._log_values = []  # ... and the values they held before.
+        self._marks = array('l')  # Length of undo log at each commit().
+        # Generation which backed up each slot. Generation changes at each
+        # commit() and reset(), so that slots are backed up once per layer,
+        # or again after a reset.
+        self._generation = 0
+        self._stamps = array('l', [0]) * len(schema)
+        slots = schema.slots
+        for key, value in initial.iteritems():
+            self._values[slots[key]] = value
+
+    @property
+    def schema(self):
+        """:py:class:`Schema` instance, shared with copies."""
+        return self._schema
+
+    def __copy__(self):
+        """Copy operator.
+
+        >>> from copy import copy
+        >>> s1 = SchemaStackedDict(['a', 'b'], a=1)
+        >>> s2 = copy(s1)
+        >>> s2['b'] = 2
+        >>> dict(s1)
+        {'a': 1}
+        >>> s1.schema is s2.schema
+        True
+
+        """
+        duplicate = self.__class__.__new__(self.__class__)
+        duplicate.__dict__.update(self.__dict__)
+        for attribute in ('_values', '_log_slots', '_log_values', '_marks',
+                          '_stamps'):
+            setattr(duplicate, attribute, copy(getattr(self, attribute)))
+        return duplicate
+
+    def __len__(self):
+        """Return number of elements.
+
+        >>> s = SchemaStackedDict(['a', 'b', 'c'], a=1, b=2)
+        >>> len(s)
+        2
+        >>> s.commit()['c'] = 3
+        >>> len(s)
+        3
+        >>> del s['a']
+        >>> len(s)
+        2
+        >>> len(s.reset())
+        2
+
+        """
+        return self._len
+
+    def __getitem__(self, key):
+        value = self._values[self._schema.slots[key]]
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        slot = self._schema.slots[key]
+        values = self._values
+        old_value = values[slot]
+        if self._marks and self._stamps[slot] != self._generation:
+            # Backup value, once per layer.
+            self._stamps[slot] = self._generation
+            self._log_slots.append(slot)
+            self._log_values.append(old_value)
+        if old_value is _MISSING:
+            self._len += 1
+        values[slot] = value
+
+    def update(self, *args, **kwargs):
+        """Update instance from a mapping or an iterable of (key, value)
+        pairs, and keyword arguments, in one pass.
+
+        Affects only current layer.
+
+        >>> s = SchemaStackedDict(['a', 'b', 'c'], a=1)
+        >>> s.commit().update([('a', 'A'), ('b', 2)], c=3)
+        >>> dict(s) == {'a': 'A', 'b': 2, 'c': 3}
+        True
+        >>> dict(s.reset())
+        {'a': 1}
+        >>> s.update({'a': 'A'}, {'c': 3})
+        Traceback (most recent call last):
+        ...
+        TypeError: update expected at most 1 arguments, got 2
+
+        """
+        if len(args) > 1:
+            raise TypeError('update expected at most 1 arguments, got %d'
+                            % len(args))
+        items = dict(*args, **kwargs)
+        slots = self._schema.slots
+        values = self._values
+        backup = bool(self._marks)
+        stamps = self._stamps
+        generation = self._generation
+        log_slots = self._log_slots
+        log_values = self._log_values
+        length = self._len
+        try:
+            for key, value in items.iteritems():
+                slot = slots[key]
+                old_value = values[slot]
+                if backup and stamps[slot] != generation:
+                    stamps[slot] = generation
+                    log_slots.append(slot)
+                    log_values.append(old_value)
+                if old_value is _MISSING:
+                    length += 1
+                values[slot] = value
+        finally:
+            self._len = length
+
+    def __delitem__(self, key):
+        """Remove a key/value pair from current layer.
+
+        >>> s = SchemaStackedDict(['a', 'b'], a=1)
+        >>> silent = s.commit()
+        >>> del s['a']
+        >>> del s['a']
+        Traceback (most recent call last):
+        ...
+        KeyError: 'a'
+        >>> dict(s.reset())
+        {'a': 1}
+
+        """
+        slot = self._schema.slots[key]
+        values = self._values
+        old_value = values[slot]
+        if old_value is _MISSING:
+            raise KeyError(key)
+        if self._marks and self._stamps[slot] != self._generation:
+            self._stamps[slot] = self._generation
+            self._log_slots.append(slot)
+            self._log_values.append(old_value)
+        self._len -= 1
+        values[slot] = _MISSING
+
+    def __iter__(self):
+        """Iterate over keys, in schema order.
+
+        >>> list(SchemaStackedDict(['a', 'b', 'c'], c=3, a=1))
+        ['a', 'c']
+
+        """
+        for key, value in izip(self._schema.keys, self._values):
+            if value is not _MISSING:
+                yield key
+
+    def __contains__(self, key):
+        """Implement "in" operator.
+
+        >>> s = SchemaStackedDict(['a', 'b'], a=1)
+        >>> 'a' in s
+        True
+        >>> 'b' in s
+        False
+        >>> 'c' in s
+        False
+
+        """
+        slot = self._schema.slots.get(key)
+        return slot is not None and self._values[slot] is not _MISSING
+
+    def __enter__(self):
+        """Implement context management ("with" statement).
+
+        >>> s = SchemaStackedDict(['a'], a=1)
+        >>> with s:
+        ...    s['a'] = 'one'
+        >>> s['a']
+        1
+
+        """
+        self.commit()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Implement context management ("with" statement)."""
+        self.reset()
+
+    def copy(self):
+        """Return a shallow copy of instance."""
+        return copy(self)
+
+    def commit(self):
+        """Save current dictionary state, record next changes in the undo log.
+
+        Returns instance, so that you can chain operations.
+
+        >>> s = SchemaStackedDict(['a'], a=1)
+        >>> s.commit().update(a='A')
+        >>> dict(s)
+        {'a': 'A'}
+        >>> dict(s.reset())
+        {'a': 1}
+
+        """
+        self._marks.append(len(self._log_slots))
+        self._generation += 1
+        return self
+
+    def reset(self):
+        """Restore dictionary to state before last :py:meth:`commit`.
+
+        Slots are restored in reverse order of the undo log, so that the
+        oldest backup of a slot wins.
+
+        >>> s = SchemaStackedDict(['a', 'b', 'c'], a=1, b=2)
+        >>> s.commit().update(a='A', c=3)
+        >>> del s['b']
+        >>> s.commit().update(a='AA', b='BB')
+        >>> dict(s.reset()) == {'a': 'A', 'c': 3}
+        True
+        >>> dict(s.reset()) == {'a': 1, 'b': 2}
+        True
+
+        Raises NoRevisionException when invoked on an instance that hasn't
+        been committed yet.
+
+        >>> s.reset()
+        Traceback (most recent call last):
+        ...
+        NoRevisionException
+
+        """
+        try:
+            mark = self._marks.pop()
+        except IndexError:
+            raise NoRevisionException()
+        # Stamps of the lower layer may be stale: its slots may be backed up
+        # again, which is harmless.
+        self._generation += 1
+        log_slots = self._log_slots
+        index = len(log_slots)
+        if index == mark:
+            return self
+        log_values = self._log_values
+        values = self._values
+        length = self._len
+        while index > mark:
+            index -= 1
+            slot = log_slots[index]
+            old_value = log_values[index]
+            if values[slot] is _MISSING:
+                length += 1
+            if old_value is _MISSING:
+                length -= 1
+            values[slot] = old_value
+        self._len = length
+        del log_slots[mark:]
+        del log_values[mark:]
+        return self
@@ -0,0 +1,307 @@
+"""StackedDict variant whose keys are spread across worker processes."""
+import cPickle
+from collections import MutableMapping
+from multiprocessing import cpu_count, Pipe, Process
+
+from wardrobe.stackeddict import NoRevisionException, StackedDict
+
+
+class _Worker(object):
+    """Hold one shard of a ShardedStackedDict, in a worker process.
+
+    Commands received are names of methods, which are called with arguments.
+
+    """
+    def __init__(self, initial):
+        self.stackeddict = StackedDict(initial)
+
+    def serve(self, connection):
+        """Run commands received from connection until 'close'."""
+        while True:
+            command, args = connection.recv()
+            if command == 'close':
+                break
+            try:
+                reply = (True, getattr(self, command)(*args))
+            except Exception as exception:
+                reply = (False, exception)
+            try:
+                connection.send(reply)
+            except Exception as exception:  # Reply cannot be pickled.
+                if not reply[0]:
+                    exception = reply[1]
+                connection.send((False, Exception(repr(exception))))
+        connection.close()
+
+    def get_many(self, keys, default):
+        get = self.stackeddict.get
+        return [get(key, default) for key in keys]
+
+    def getitem(self, key):
+        return self.stackeddict[key]
+
+    def contains(self, key):
+        return key in self.stackeddict
+
+    def update(self, items):
+        self.stackeddict.update(items)
+
+    def delitem(self, key):
+        del self.stackeddict[key]
+
+    def pop(self, key, *args):
+        return self.stackeddict.pop(key, *args)
+
+    def clear(self):
+        self.stackeddict.clear()
+
+    def keys(self):
+        return self.stackeddict.keys()
+
+    def items(self):
+        return self.stackeddict.items()
+
+    def length(self):
+        return len(self.stackeddict)
+
+    def commit(self):
+        self.stackeddict.commit()
+
+    def reset(self):
+        self.stackeddict.reset()
+
+
+def _serve(connection, initial):
+    """Entry point of worker processes."""
+    _Worker(initial).serve(connection)
+
+
+class ShardedStackedDict(MutableMapping):
+    """StackedDict whose keys are spread across worker processes, by hash.
+
+    Each worker process holds a StackedDict with the keys of its shard.
+    :py:meth:`commit` and :py:meth:`reset` are applied to all shards, so that
+    they always have the same depth. Batch operations, :py:meth:`get_many`
+    and :py:meth:`update`, send one message per shard and wait for all
+    replies at once.
+
+    >>> from wardrobe import ShardedStackedDict
+    >>> s = ShardedStackedDict(top='blue', bottom='red')
+    >>> s.commit().update(top='white', cape='red')
+    >>> s.get_many(['top', 'bottom', 'cape', 'boots'])
+    ['white', 'red', 'red', None]
+    >>> dict(s.reset()) == {'top': 'blue', 'bottom': 'red'}
+    True
+    >>> s.reset()
+    Traceback (most recent call last):
+    ...
+    NoRevisionException
+    >>> s.close()
+
+    Keys and values are pickled to be sent to workers. Each call costs a round
+    trip to a worker process, so batch operations are much cheaper than item
+    by item access. Batch operations with items which can't be pickled fail
+    as a whole, and change nothing.
+
+    >>> from threading import Lock
+    >>> class TwoShardsStackedDict(ShardedStackedDict):
+    ...     shard_count = 2
+    >>> s = TwoShardsStackedDict(zip(range(10), range(10)))
+    >>> s.update({0: 'zero', 1: Lock()})
+    Traceback (most recent call last):
+    ...
+    TypeError: can't pickle thread.lock objects
+    >>> s.get_many([0, 1])
+    [0, 1]
+    >>> s.close()
+
+    Worker processes are started by the constructor and stopped by
+    :py:meth:`close`. Use :py:func:`contextlib.closing` to stop them at the
+    end of a ``with`` block:
+
+    >>> from contextlib import closing
+    >>> with closing(ShardedStackedDict(top='blue')) as s:
+    ...     s['top']
+    'blue'
+
+    """
+    #: Number of worker processes. ``None`` means the number of CPUs.
+    shard_count = None
+
+    def __init__(self, initial=None, **kwargs):
+        if initial is None:
+            initial = kwargs
+        elif kwargs:
+            initial = dict(initial, **kwargs)
+        count = self.shard_count or cpu_count()
+        shards = [{} for index in range(count)]
+        for key, value in dict(initial).iteritems():
+            shards[hash(key) % count][key] = value
+        self._connections = []
+        self._processes = []
+        for shard in shards:
+            connection, worker_connection = Pipe()
+            process = Process(target=_serve, args=(worker_connection, shard))
+            process.daemon = True
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+        self._depth = 0
+
+    def close(self):
+        """Stop worker processes. The dictionary is unusable afterwards."""
+        for connection in self._connections:
+            connection.send(('close', ()))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections = []
+        self._processes = []
+
+    def _shard(self, key):
+        """Return index of shard of key."""
+        return hash(key) % len(self._connections)
+
+    def _call(self, index, command, *args):
+        """Run command on one shard and return result."""
+        return self._call_many([(index, command, args)])[0]
+
+    def _call_all(self, command, *args):
+        """Run command on all shards and return list of results."""
+        return self._call_many([(index, command, args)
+                                for index in range(len(self._connections))])
+
+    def _call_many(self, calls):
+        """Send (shard index, command, args) calls, then wait for all replies
+        and return list of results.
+
+        If some commands fail, the first exception is raised once all replies
+        have been received. Commands are all pickled before any is sent, so
+        that a pickling error leaves no reply unread.
+
+        """
+        connections = self._connections
+        messages = [cPickle.dumps((command, args), cPickle.HIGHEST_PROTOCOL)
+                    for index, command, args in calls]
+        for (index, command, args), message in zip(calls, messages):
+            connections[index].send_bytes(message)
+        results = []
+        error = None
+        for index, command, args in calls:
+            succeeded, result = connections[index].recv()
+            if not succeeded and error is None:
+                error = result
+            results.append(result)
+        if error is not None:
+            raise error
+        return results
+
+    def _group(self, keys):
+        """Return {shard index: list of keys} for keys."""
+        groups = {}
+        for key in keys:
+            index = self._shard(key)
+            try:
+                groups[index].append(key)
+            except KeyError:
+                groups[index] = [key]
+        return groups
+
+    def __getitem__(self, key):
+        return self._call(self._shard(key), 'getitem', key)
+
+    def __setitem__(self, key, value):
+        self._call(self._shard(key), 'update', [(key, value)])
+
+    def __delitem__(self, key):
+        self._call(self._shard(key), 'delitem', key)
+
+    def __contains__(self, key):
+        return self._call(self._shard(key), 'contains', key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return sum(self._call_all('length'))
+
+    def keys(self):
+        keys = []
+        for shard_keys in self._call_all('keys'):
+            keys.extend(shard_keys)
+        return keys
+
+    def items(self):
+        items = []
+        for shard_items in self._call_all('items'):
+            items.extend(shard_items)
+        return items
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def pop(self, key, *args):
+        return self._call(self._shard(key), 'pop', key, *args)
+
+    def clear(self):
+        self._call_all('clear')
+
+    def get_many(self, keys, default=None):
+        """Return list of values of keys, ``default`` for missing keys.
+
+        Sends one message per shard involved.
+
+        """
+        keys = list(keys)
+        groups = self._group(keys)
+        indexes = list(groups)
+        results = self._call_many([(index, 'get_many', (groups[index],
+                                                        default))
+                                   for index in indexes])
+        values = {}
+        for index, shard_values in zip(indexes, results):
+            values.update(zip(groups[index], shard_values))
+        return [values[key] for key in keys]
+
+    def update(self, *args, **kwargs):
+        """Update dictionary from a mapping or an iterable of (key, value)
+        pairs, and keyword arguments.
+
+        Sends one message per shard involved.
+
+        """
+        items = dict(*args, **kwargs)
+        groups = self._group(items)
+        self._call_many([(index, 'update',
+                          ([(key, items[key]) for key in keys],))
+                         for index, keys in groups.iteritems()])
+
+    @property
+    def depth(self):
+        """Number of layers, i.e. of :py:meth:`reset` calls allowed."""
+        return self._depth
+
+    def commit(self):
+        """Create a new layer on all shards and return self."""
+        self._call_all('commit')
+        self._depth += 1
+        return self
+
+    def reset(self):
+        """Drop the last layer on all shards and return self.
+
+        Raises NoRevisionException when there is no layer.
+
+        """
+        if not self._depth:
+            raise NoRevisionException()
+        self._call_all('reset')
+        self._depth -= 1
+        return self
@@ -0,0 +1,190 @@
+"""StackedDict variant with sorted keys and namespaces."""
+from bisect import bisect_left, insort
+from collections import MutableMapping
+import sys
+
+from wardrobe.observable import MISSING, ObservableStackedDict
+
+
+def _prefix_end(prefix):
+    """Return the smallest string greater than every string that starts with
+    prefix, or None if there is no such string.
+
+    >>> _prefix_end('db.')
+    'db/'
+    >>> _prefix_end('a\\xff')
+    'b'
+    >>> _prefix_end(u'a') == u'b'
+    True
+    >>> _prefix_end('') is None
+    True
+
+    """
+    if isinstance(prefix, unicode):
+        last_code, to_char = sys.maxunicode, unichr
+    else:
+        last_code, to_char = 255, chr
+    while prefix:
+        code = ord(prefix[-1])
+        if code < last_code:
+            return prefix[:-1] + to_char(code + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+class SortedStackedDict(ObservableStackedDict):
+    """StackedDict which keeps its keys sorted.
+
+    A sorted list of keys is updated on each creation or deletion of a key,
+    including those made by :py:meth:`reset`. Iteration follows key order,
+    ranges of keys and prefixes are found by bisection.
+
+    >>> from wardrobe import SortedStackedDict
+    >>> s = SortedStackedDict({'db.primary.host': 'alpha',
+    ...                        'db.primary.port': 5432,
+    ...                        'db.replica.host': 'beta',
+    ...                        'debug': False})
+    >>> s.keys()
+    ['db.primary.host', 'db.primary.port', 'db.replica.host', 'debug']
+    >>> list(s.iterprefix('db.primary.'))
+    ['db.primary.host', 'db.primary.port']
+    >>> list(s.irange('db.r', 'e'))
+    ['db.replica.host', 'debug']
+
+    :py:meth:`namespace` returns views on keys with a given prefix.
+
+    >>> primary = s.namespace('db.primary.')
+    >>> sorted(primary.items())
+    [('host', 'alpha'), ('port', 5432)]
+    >>> s.commit()  # doctest: +ELLIPSIS
+    <wardrobe.sortedkeys.SortedStackedDict object at 0x...>
+    >>> primary['user'] = 'clark'
+    >>> s['db.primary.user']
+    'clark'
+    >>> silent = s.reset()
+    >>> 'user' in primary
+    False
+
+    """
+    def __init__(self, initial=None, **kwargs):
+        super(SortedStackedDict, self).__init__(initial, **kwargs)
+        self._keys = sorted(self._dict)
+
+    def __copy__(self):
+        duplicate = super(SortedStackedDict, self).__copy__()
+        duplicate._keys = list(self._keys)
+        return duplicate
+
+    def _changed(self, key, old_value, new_value):
+        if old_value is MISSING:
+            if new_value is not MISSING:
+                insort(self._keys, key)
+        elif new_value is MISSING:
+            del self._keys[bisect_left(self._keys, key)]
+        super(SortedStackedDict, self)._changed(key, old_value, new_value)
+
+    def irange(self, start=None, stop=None):
+        """Iterate over keys such as ``start <= key < stop``, in order.
+
+        ``None`` means no bound.
+
+        >>> s = SortedStackedDict.fromkeys(range(10))
+        >>> list(s.irange(3, 6))
+        [3, 4, 5]
+        >>> list(s.irange(stop=2))
+        [0, 1]
+
+        """
+        keys = self._keys
+        index = 0 if start is None else bisect_left(keys, start)
+        end = len(keys) if stop is None else bisect_left(keys, stop)
+        while index < end:
+            yield keys[index]
+            index += 1
+
+    def iterprefix(self, prefix):
+        """Iterate over keys that start with prefix, in order."""
+        return self.irange(prefix, _prefix_end(prefix))
+
+    def namespace(self, prefix):
+        """Return a :py:class:`Namespace` view on keys that start with
+        prefix."""
+        return Namespace(self, prefix)
+
+    def __iter__(self):
+        """Iterate over keys, in order."""
+        return iter(list(self._keys))
+
+    def iterkeys(self):
+        return self.__iter__()
+
+    def keys(self):
+        """Return sorted list of keys."""
+        return list(self._keys)
+
+    def iteritems(self):
+        for key in self.keys():
+            yield key, self._dict[key]
+
+    def itervalues(self):
+        for key in self.keys():
+            yield self._dict[key]
+
+    def values(self):
+        return list(self.itervalues())
+
+
+class Namespace(MutableMapping):
+    """View on the keys of a :py:class:`SortedStackedDict` which start with a
+    prefix.
+
+    Keys of the view are relative to the prefix. Reads and writes go through
+    to the dictionary, so writes are recorded in its current layer. Lookups
+    and iteration cost the size of the namespace, not of the dictionary.
+
+    >>> s = SortedStackedDict({'db.primary.host': 'alpha', 'db.port': 5432,
+    ...                        'debug': False})
+    >>> db = s.namespace('db.')
+    >>> db.keys()
+    ['port', 'primary.host']
+    >>> len(db)
+    2
+    >>> db.namespace('primary.')['host']
+    'alpha'
+    >>> del db['port']
+    >>> s.keys()
+    ['db.primary.host', 'debug']
+
+    """
+    def __init__(self, stackeddict, prefix):
+        self._stackeddict = stackeddict
+        self.prefix = prefix
+
+    def __getitem__(self, key):
+        return self._stackeddict[self.prefix + key]
+
+    def __setitem__(self, key, value):
+        self._stackeddict[self.prefix + key] = value
+
+    def __delitem__(self, key):
+        del self._stackeddict[self.prefix + key]
+
+    def __contains__(self, key):
+        return self.prefix + key in self._stackeddict
+
+    def __iter__(self):
+        start = len(self.prefix)
+        for key in list(self._stackeddict.iterprefix(self.prefix)):
+            yield key[start:]
+
+    def __len__(self):
+        keys = self._stackeddict._keys
+        start = bisect_left(keys, self.prefix)
+        end = _prefix_end(self.prefix)
+        if end is None:
+            return len(keys) - start
+        return bisect_left(keys, end) - start
+
+    def namespace(self, prefix):
+        """Return a view on keys that start with prefix, in this namespace."""
+        return Namespace(self._stackeddict, self.prefix + prefix)
@@ -0,0 +1,332 @@
+"""StackedArray implementation.
+
+Requires `numpy`_, which is an optional dependency of wardrobe:
+
+.. code-block:: sh
+
+   pip install wardrobe[numpy]
+
+.. _`numpy`: http://numpy.scipy.org
+
+"""
+from collections import deque
+from copy import copy
+
+import numpy
+
+from wardrobe.stackeddict import NoRevisionException
+
+
+class StackedArray(object):
+    """Numpy array with :py:meth:`commit` and :py:meth:`reset` methods.
+
+    Each layer records the flat indices of changed elements and their former
+    values, so that rollback costs scale with the number of changed elements,
+    not with the size of the array.
+
+    >>> from wardrobe.stackedarray import StackedArray
+    >>> state = StackedArray([1, 2, 3, 4])
+    >>> state.commit()  # doctest: +ELLIPSIS
+    <wardrobe.stackedarray.StackedArray object at 0x...>
+    >>> state[1:3] = 0
+    >>> state[-1] += 10
+    >>> state.array
+    array([ 1,  0,  0, 14])
+    >>> state.reset()  # doctest: +ELLIPSIS
+    <wardrobe.stackedarray.StackedArray object at 0x...>
+    >>> state.array
+    array([1, 2, 3, 4])
+
+    Any numpy index can be used, including multidimensional, fancy and boolean
+    indexes.
+
+    >>> grid = StackedArray([[1, 2], [3, 4]])
+    >>> grid.commit()[grid.array > 2] = 0
+    >>> grid.array
+    array([[1, 2],
+           [0, 0]])
+    >>> grid.reset().array
+    array([[1, 2],
+           [3, 4]])
+
+    """
+    def __init__(self, initial, dtype=None):
+        """Constructor.
+
+        ``initial`` and ``dtype`` are passed to :py:func:`numpy.array`, i.e.
+        ``initial`` is copied.
+
+        >>> StackedArray([1, 2], dtype=float).array
+        array([1., 2.])
+
+        """
+        self._array = numpy.array(initial, dtype=dtype)  # Active state.
+        self._flat = self._array.reshape(-1)  # Flat view of active state.
+        self._changes = deque([])  # Store (flat indices, former values)
+                                   # pairs of each layer.
+
+    def __copy__(self):
+        """Copy operator.
+
+        >>> from copy import copy
+        >>> right = StackedArray([1, 2])
+        >>> left = copy(right)
+        >>> left[0] = 0
+        >>> right.array
+        array([1, 2])
+
+        """
+        duplicate = self.__class__.__new__(self.__class__)
+        duplicate._array = self._array.copy()
+        duplicate._flat = duplicate._array.reshape(-1)
+        duplicate._changes = deque([copy(changes)
+                                    for changes in self._changes])
+        return duplicate
+
+    def __len__(self):
+        """Return length of first dimension.
+
+        >>> len(StackedArray([[1, 2], [3, 4], [5, 6]]))
+        3
+
+        """
+        return len(self._array)
+
+    def __getitem__(self, index):
+        """Return element(s) at index.
+
+        Returned arrays are copies: use :py:meth:`__setitem__` to change
+        values. Augmented assignments work as usual, they are backed up.
+
+        >>> s = StackedArray([1, 2, 3])
+        >>> s[1]
+        2
+        >>> selection = s[1:]
+        >>> selection[0] = 0
+        >>> s.array
+        array([1, 2, 3])
+        >>> s.commit()[1:] += 1
+        >>> s[[0, 1]] *= 2
+        >>> s.array
+        array([2, 6, 4])
+        >>> s.reset().array
+        array([1, 2, 3])
+
+        """
+        value = self._array[index]
+        if isinstance(value, numpy.ndarray) and value.base is not None:
+            value = value.copy()  # Fancy indexes already return copies.
+        return value
+
+    def _indices(self, index):
+        """Return flat indices of elements selected by index.
+
+        Coordinates are computed from index, so that memory scales with the
+        number of selected elements, not with the size of the array. Order
+        of indices doesn't matter.
+
+        >>> s = StackedArray(numpy.zeros((3, 4)))
+        >>> s._indices((Ellipsis, 1))
+        array([1, 5, 9])
+        >>> s._indices(([0, -1], slice(None, 2)))
+        array([0, 1, 8, 9])
+        >>> s._indices(s.array == 0).size
+        12
+
+        """
+        shape = self._array.shape
+        if not isinstance(index, tuple):
+            index = (index,)
+        components = []
+        for component in index:
+            if component is None or component is Ellipsis \
+               or isinstance(component, slice):
+                components.append(component)
+                continue
+            component = numpy.asarray(component)
+            if component.dtype == bool:
+                components.extend(numpy.nonzero(component))
+            elif not component.size:  # e.g. [], which is a float array.
+                components.append(component.astype(numpy.intp))
+            else:
+                components.append(component)
+        axes = len([component for component in components
+                    if component is not None and component is not Ellipsis])
+        if axes > len(shape):
+            raise IndexError('too many indices for array')
+        missing = [slice(None)] * (len(shape) - axes)
+        ellipses = [position for position, component in enumerate(components)
+                    if component is Ellipsis]
+        if ellipses:
+            components[ellipses[0]:ellipses[0] + 1] = missing
+        else:
+            components.extend(missing)
+        ranges = []  # (axis, coordinates) for each slice.
+        arrays = []  # (axis, indices) for each integer index.
+        axis = 0
+        for component in components:
+            if component is None or component is Ellipsis:
+                continue  # New axis, or extra ellipsis.
+            if isinstance(component, slice):
+                ranges.append(
+                    (axis, numpy.arange(*component.indices(shape[axis]))))
+            elif component.dtype.kind in 'iu':
+                arrays.append((axis, component))
+            else:
+                raise IndexError('arrays used as indices must be of '
+                                 'integer (or boolean) type')
+            axis += 1
+        # Integer indices broadcast together, then each slice adds a
+        # dimension.
+        broadcast = numpy.broadcast_arrays(*[array for axis, array in arrays])
+        prefix = broadcast[0].shape if broadcast else ()
+        if not shape or 0 in prefix \
+           or [array for axis, array in ranges if not array.size]:
+            # Nothing selected, like numpy, don't check bounds.
+            return numpy.zeros(0 if shape else 1, dtype=int)
+        coordinates = [None] * len(shape)
+        suffix = (1,) * len(ranges)
+        for (axis, array), broadcast_array in zip(arrays, broadcast):
+            size = shape[axis]
+            array = numpy.where(broadcast_array < 0, broadcast_array + size,
+                                broadcast_array)
+            invalid = (array < 0) | (array >= size)
+            if invalid.any():
+                raise IndexError(
+                    'index %d is out of bounds for axis %d with size %d'
+                    % (broadcast_array[invalid].flat[0], axis, size))
+            coordinates[axis] = array.reshape(prefix + suffix)
+        for position, (axis, array) in enumerate(ranges):
+            coordinates[axis] = array.reshape(
+                (1,) * (len(prefix) + position) + (-1,)
+                + (1,) * (len(ranges) - position - 1))
+        return numpy.ravel(numpy.ravel_multi_index(coordinates, shape))
+
+    def __setitem__(self, index, value):
+        """Set element(s) at index, backing up former values if necessary.
+
+        >>> s = StackedArray([1, 2, 3])
+        >>> s.commit()[[0, 2]] = [10, 30]
+        >>> s.array
+        array([10,  2, 30])
+        >>> s[5] = 0
+        Traceback (most recent call last):
+        ...
+        IndexError: index 5 is out of bounds for axis 0 with size 3
+
+        """
+        if self._changes:
+            indices = self._indices(index)
+            self._changes[0].append((indices, self._flat[indices]))
+        self._array[index] = value
+
+    def __iter__(self):
+        """Iterate over first dimension.
+
+        >>> list(StackedArray([1, 2, 3]))
+        [1, 2, 3]
+
+        """
+        return iter(self.array)
+
+    def __array__(self, dtype=None):
+        """Implement numpy's array interface.
+
+        >>> numpy.sum(StackedArray([1, 2, 3]))
+        6
+
+        """
+        if dtype is None:
+            return self.array
+        return self._array.astype(dtype)
+
+    def __enter__(self):
+        """Implement context management ("with" statement).
+
+        >>> s = StackedArray([1, 2])
+        >>> with s:
+        ...    s[0] = 0
+        >>> s.array
+        array([1, 2])
+
+        """
+        self.commit()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Implement context management ("with" statement)."""
+        self.reset()
+
+    @property
+    def array(self):
+        """Read-only view of current state."""
+        view = self._array.view()
+        view.flags.writeable = False
+        return view
+
+    @property
+    def dtype(self):
+        """Data type of elements."""
+        return self._array.dtype
+
+    @property
+    def shape(self):
+        """Shape of array."""
+        return self._array.shape
+
+    def copy(self):
+        """Return a copy of instance, including layers."""
+        return copy(self)
+
+    def commit(self):
+        """Save current array state, record next changes in some diff
+        history.
+
+        Returns StackedArray instance, so that you can chain operations.
+
+        """
+        self._changes.appendleft([])
+        return self
+
+    def reset(self):
+        """Restore array to state before last :py:meth:`commit`.
+
+        Former values are restored with one vectorized assignment. When an
+        element has been changed several times in the layer, its oldest
+        backup wins.
+
+        >>> s = StackedArray([1, 2, 3])
+        >>> s.commit()[0] = 10
+        >>> s[:2] = 20
+        >>> s[0] = 30
+        >>> s.commit()[2] = 40
+        >>> s.reset().array
+        array([30, 20,  3])
+        >>> s.reset().array
+        array([1, 2, 3])
+
+        Raises NoRevisionException when invoked on a StackedArray instance
+        that hasn't been committed yet.
+
+        >>> s.reset()
+        Traceback (most recent call last):
+        ...
+        NoRevisionException
+
+        """
+        try:
+            changes = self._changes.popleft()
+        except IndexError:
+            raise NoRevisionException()
+        if not changes:
+            return self
+        if len(changes) == 1:
+            indices, values = changes[0]
+        else:
+            # Changes are in chronological order: keep first backup of each
+            # element.
+            indices = numpy.concatenate([pair[0] for pair in changes])
+            values = numpy.concatenate([pair[1] for pair in changes])
+            indices, first = numpy.unique(indices, return_index=True)
+            values = values[first]
+        self._flat[indices] = values
+        return self
@@ -3,9 +3,13 @@ from collections import deque, MutableMapping
 from copy import copy
 
 
+#: Marker for keys deleted by a layer, in forward changes.
+_DELETED = object()
+
+
 class NoRevisionException(Exception):
     """Exception raised when reset() has been called more times than
-    commit()."""
+    commit(), or when redo() has nothing to redo."""
 
 
 class StackedDict(MutableMapping):
@@ -45,6 +49,10 @@ class StackedDict(MutableMapping):
     True
 
     """
+    #: Tracer of layer operations, such as
+    #: :py:class:`wardrobe.tracing.TraceWriter`, or ``None``. Set it on the
+    #: class to trace all instances.
+    tracer = None
 
     def __init__(self, initial=None, **kwargs):
         """Constructor.
@@ -56,17 +64,32 @@ class StackedDict(MutableMapping):
         >>> dict(StackedDict(a=1))
         {'a': 1}
 
+        A dict passed as ``initial`` without keyword arguments is used as is,
+        i.e. it is not copied. Otherwise, ``initial``, which may be any
+        iterable of (key, value) pairs, such as a generator, is consumed into a
+        new dict, along with keyword arguments.
+
+        >>> s = StackedDict((str(i), i) for i in range(3))
+        >>> dict(s) == {'0': 0, '1': 1, '2': 2}
+        True
+        >>> dict(StackedDict({'a': 1}, b=2)) == {'a': 1, 'b': 2}
+        True
+
         """
         if initial is None:
             if kwargs:
                 initial = kwargs
             else:
                 initial = {}
+        elif kwargs or not isinstance(initial, dict):
+            initial = dict(initial, **kwargs)
         self._dict = initial  # Active layer.
         self._created = deque([])  # Store keys that have been created in
                                    # current layer.
         self._overriden = deque([])  # Store overriden (deleted or updated)
                                    # (key, value) pairs.
+        self._redo = []  # Store forward changes of layers dropped by
+                         # reset(redo=True).
 
     def __copy__(self):
         """Copy operator.
@@ -83,11 +106,23 @@ class StackedDict(MutableMapping):
         >>> left == right
         True
 
+        Layers are copied too, so that changes to the copy don't affect the
+        original.
+
+        >>> right.commit()  # doctest: +ELLIPSIS
+        <wardrobe.stackeddict.StackedDict object at 0x...>
+        >>> left = copy(right)
+        >>> left['a'] = 1
+        >>> dict(right.reset())
+        {}
+
         """
         duplicate = copy(super(StackedDict, self))
         duplicate._dict = copy(self._dict)
-        duplicate._created = copy(self._created)
-        duplicate._overriden = copy(self._overriden)
+        duplicate._created = deque(copy(layer) for layer in self._created)
+        duplicate._overriden = deque(copy(layer)
+                                     for layer in self._overriden)
+        duplicate._redo = copy(self._redo)
         return duplicate
 
     def __len__(self):
@@ -152,7 +187,22 @@ class StackedDict(MutableMapping):
     def _has_layers(self):
         return bool(self._overriden)
 
+    @property
+    def depth(self):
+        """Depth of current layer, i.e. number of layers on top of the base.
+
+        >>> s = StackedDict()
+        >>> s.depth
+        0
+        >>> s.commit().commit().depth
+        2
+
+        """
+        return len(self._created)
+
     def __setitem__(self, key, value):
+        if self._redo:
+            self._redo = []
         if self._has_layers():  # We may have to backup value.
             if key not in self._dict:  # Adding a brand new key/value pair.
                 self._created[0].add(key)
@@ -205,6 +255,20 @@ class StackedDict(MutableMapping):
         ...
         KeyError: 'a'
 
+        Keys created then deleted in a layer are gone, and the value backed up
+        when a key was first overriden in a layer is kept.
+
+        >>> s = StackedDict(a=1)
+        >>> silent = s.commit()
+        >>> s['b'] = 2
+        >>> del s['b']
+        >>> s['a'] = 'A'
+        >>> del s['a']
+        >>> dict(s)
+        {}
+        >>> dict(s.reset())
+        {'a': 1}
+
         .. note::
 
            Current implementation maintains a list of deleted keys for each
@@ -216,9 +280,15 @@ class StackedDict(MutableMapping):
             try:
                 self._created[0].remove(key)
             except KeyError:
-                self._overriden[0][key] = self._dict.pop(key)
+                value = self._dict.pop(key)
+                if key not in self._overriden[0]:
+                    self._overriden[0][key] = value
+            else:
+                del self._dict[key]
         else:
             del self._dict[key]
+        if self._redo:
+            self._redo = []
 
     def __iter__(self):
         """Iterate over keys.
@@ -305,7 +375,22 @@ class StackedDict(MutableMapping):
         >>> dict(s) == dict(a=1, b=2, c=3)
         True
 
+        Keys that have already been deleted in current layer are skipped.
+
+        >>> s = StackedDict(a=1, b=2)
+        >>> s.commit().update(a='A')
+        >>> del s['a']
+        >>> s.clear()
+        >>> dict(s.reset()) == dict(a=1, b=2)
+        True
+
         """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+            entries = len(self._dict)
+        if self._redo:
+            self._redo = []
         if self._has_layers():
             # Delete keys created in current layer.
             for key in self._created[0]:
@@ -313,12 +398,14 @@ class StackedDict(MutableMapping):
             self._created[0] = set()
             # Delete keys that have already been backuped.
             for key in self._overriden[0].keys():
-                del self._dict[key]
+                self._dict.pop(key, None)
             # Remaining keys are overriden ones.
             for key in self._dict.keys():
                 self._overriden[0][key] = self._dict.pop(key)
         else:
             self._dict.clear()
+        if tracer is not None:
+            tracer.span('clear', start, self.depth, entries)
 
     def copy(self):
         """Return a shallow copy of instance.
@@ -356,6 +443,64 @@ class StackedDict(MutableMapping):
         initial = dict.fromkeys(seq, value)
         return cls(initial)
 
+    @classmethod
+    def from_layers(cls, layers):
+        """Create a new StackedDict from an iterable of mappings: the first
+        one is the base, each other one is a layer on top of the previous
+        ones.
+
+        The result is the same as calling ``commit().update(layer)`` for each
+        layer, but layers are recorded in one pass, with one lookup per item.
+        Mappings are not modified.
+
+        Subclasses which override :py:meth:`__setitem__` or :py:meth:`commit`
+        get layers through these methods instead. The instance is created with
+        ``cls(base)``: subclasses whose constructor takes other arguments,
+        such as :py:class:`~wardrobe.remote.RemoteStackedDict`, override
+        this method.
+
+        >>> s = StackedDict.from_layers([{'a': 1, 'b': 2},
+        ...                              {'b': 'B', 'c': 3},
+        ...                              {'a': 'A'}])
+        >>> dict(s) == {'a': 'A', 'b': 'B', 'c': 3}
+        True
+        >>> dict(s.reset()) == {'a': 1, 'b': 'B', 'c': 3}
+        True
+        >>> dict(s.reset()) == {'a': 1, 'b': 2}
+        True
+        >>> StackedDict.from_layers([]).depth
+        0
+
+        """
+        layers = iter(layers)
+        try:
+            instance = cls(dict(next(layers)))
+        except StopIteration:
+            return cls()
+        # Unbound methods are created on each attribute access and compare
+        # their class too, so compare the underlying functions to tell whether
+        # a subclass overrides how layers are recorded.
+        if cls.__setitem__.im_func is not StackedDict.__setitem__.im_func \
+           or cls.commit.im_func is not StackedDict.commit.im_func:
+            # Let subclasses record layers their own way.
+            for layer in layers:
+                instance.commit().update(layer)
+            return instance
+        values = instance._dict
+        for layer in layers:
+            created = set()
+            overriden = {}
+            for key in layer:
+                old_value = values.get(key, _DELETED)
+                if old_value is _DELETED:
+                    created.add(key)
+                else:
+                    overriden[key] = old_value
+                values[key] = layer[key]
+            instance._created.appendleft(created)
+            instance._overriden.appendleft(overriden)
+        return instance
+
     def get(self, key, default=None):
         """Return the value for key if key is in the dictionary, else default.
 
@@ -554,6 +699,9 @@ class StackedDict(MutableMapping):
         TypeError: update expected at most 1 arguments, got 2
 
         """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
         if args:
             if len(args) > 1:
                 raise TypeError('update expected at most 1 arguments, got %d' \
@@ -561,8 +709,12 @@ class StackedDict(MutableMapping):
             other = dict(args[0])
             for key in other:
                 self[key] = other[key]
+        else:
+            other = ()
         for key in kwargs:
             self[key] = kwargs[key]
+        if tracer is not None:
+            tracer.span('update', start, self.depth, len(other) + len(kwargs))
 
     def pop(self, key, *args):
         """If key is in the dictionary, remove it and return its value, else
@@ -596,8 +748,20 @@ class StackedDict(MutableMapping):
         >>> s['b']
         2
 
+        Missing keys aren't recorded in the layer.
+
+        >>> s = StackedDict(a=1)
+        >>> s.commit().pop('b', 'B')
+        'B'
+        >>> dict(s.reset())
+        {'a': 1}
+
         """
-        value = self._dict.pop(key, *args)
+        if key not in self._dict:
+            return self._dict.pop(key, *args)
+        if self._redo:
+            self._redo = []
+        value = self._dict.pop(key)
         if self._has_layers():
             try:
                 self._created[0].remove(key)
@@ -635,6 +799,8 @@ class StackedDict(MutableMapping):
 
         """
         key, value = self._dict.popitem()
+        if self._redo:
+            self._redo = []
         if self._has_layers():
             try:  # Delete key from created keys...
                 self._created[0].remove(key)
@@ -757,11 +923,37 @@ class StackedDict(MutableMapping):
         {'a': 1}
 
         """
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if self._redo:
+            self._redo = []
         self._created.appendleft(set())
         self._overriden.appendleft({})
+        if tracer is not None:
+            tracer.span('commit', start, self.depth, 0)
         return self
 
-    def reset(self):
+    def _forward_changes(self):
+        """Return changes made in current layer, as a dict mapping keys to
+        their new values or to :py:data:`_DELETED`."""
+        changes = {}
+        for key in self._created[0]:
+            changes[key] = self._dict[key]
+        for key in self._overriden[0]:
+            changes[key] = self._dict.get(key, _DELETED)
+        return changes
+
+    def _apply(self, changes):
+        """Apply forward changes, as returned by :py:meth:`_forward_changes`,
+        to current layer."""
+        for key, value in changes.iteritems():
+            if value is _DELETED:
+                self.pop(key, None)
+            else:
+                self[key] = value
+
+    def reset(self, redo=False):
         """Restore dictionary to state before last :py:meth:`commit`.
         
         >>> s = StackedDict(a=1, b=2)
@@ -789,18 +981,85 @@ class StackedDict(MutableMapping):
         Traceback (most recent call last):
         ...
         NoRevisionException
+
+        With ``redo=True``, changes of the dropped layer are kept, so that
+        :py:meth:`redo` can re-apply them.
+
+        >>> s = StackedDict(a=1)
+        >>> s.commit().update(a='A', b=2)
+        >>> dict(s.reset(redo=True))
+        {'a': 1}
+        >>> dict(s.redo()) == {'a': 'A', 'b': 2}
+        True
         
         """
         # Pop.
         try:
-            created = self._created.popleft()
-            overriden = self._overriden.popleft()
+            created = self._created[0]
+            overriden = self._overriden[0]
         except IndexError:
             raise NoRevisionException()
+        tracer = self.tracer
+        if tracer is not None:
+            start = tracer.clock()
+        if redo:
+            changes = self._forward_changes()
+        self._created.popleft()
+        self._overriden.popleft()
         # Delete created keys.
         for key in created: 
             del self._dict[key]
         # Restore overridden (key, value) pairs. 
         for key, value in overriden.items():
             self._dict[key] = value
+        if redo:
+            self._redo.append(changes)
+        elif self._redo:
+            self._redo = []
+        if tracer is not None:
+            tracer.span('reset', start, self.depth,
+                        len(created) + len(overriden))
+        return self
+
+    def redo(self):
+        """Re-apply the last layer dropped by ``reset(redo=True)``, in a new
+        layer.
+
+        Costs the size of that layer. Any change, :py:meth:`commit` or
+        :py:meth:`reset` without ``redo`` invalidates layers that could be
+        redone.
+
+        >>> s = StackedDict(text='')
+        >>> s.commit()['text'] = 'Hello'
+        >>> s.commit()['text'] = 'Hello world'
+        >>> s.reset(redo=True).reset(redo=True)['text']
+        ''
+        >>> s.redo()['text']
+        'Hello'
+        >>> s.redo()['text']
+        'Hello world'
+        >>> s.reset(redo=True)['text'] = 'Hello you'
+        >>> s.redo()
+        Traceback (most recent call last):
+        ...
+        NoRevisionException
+
+        Failed changes do not invalidate layers that could be redone.
+
+        >>> del s.reset(redo=True)['missing']
+        Traceback (most recent call last):
+        ...
+        KeyError: 'missing'
+        >>> s.redo()['text']
+        'Hello you'
+
+        """
+        try:
+            changes = self._redo.pop()
+        except IndexError:
+            raise NoRevisionException()
+        redo = self._redo
+        self.commit()
+        self._apply(changes)
+        self._redo = redo
         return self
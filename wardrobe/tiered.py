@@ -0,0 +1,178 @@
+"""StackedDict variant which spills old layers to a compressed file."""
+from collections import deque, Mapping
+import cPickle
+from tempfile import TemporaryFile
+import zlib
+
+from wardrobe.stackeddict import StackedDict
+
+
+#: Types of keys and values which can be spilled. Objects of other types,
+#: e.g. lists or instances, may be shared with other objects or hashed by
+#: identity, which copies would not be.
+_IMMUTABLE_TYPES = frozenset([type(None), bool, int, long, float, complex,
+                              str, unicode])
+
+
+def _immutable(value):
+    """Return True if value is made of immutable builtins only.
+
+    >>> _immutable((1, 'a', frozenset([2.0])))
+    True
+    >>> _immutable((1, ['a']))
+    False
+
+    """
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        value_type = type(value)
+        if value_type is tuple or value_type is frozenset:
+            pending.extend(value)
+        elif value_type not in _IMMUTABLE_TYPES:
+            return False
+    return True
+
+
+class SpilledLayer(Mapping):
+    """Read-only mapping of backups of a layer, stored compressed in a file.
+
+    Each access loads the layer from the file, so that it doesn't stay in
+    memory.
+
+    """
+    def __init__(self, spill_file, offset, size, length):
+        self._file = spill_file
+        self.offset = offset
+        self.size = size
+        self._length = length
+
+    def load(self):
+        """Return backups as a new dict."""
+        self._file.seek(self.offset)
+        return cPickle.loads(zlib.decompress(self._file.read(self.size)))
+
+    def __getitem__(self, key):
+        return self.load()[key]
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return self._length
+
+
+class TieredStackedDict(StackedDict):
+    """StackedDict which keeps only its :py:attr:`hot_depth` most recent
+    layers in memory.
+
+    Backups of older layers are pickled, compressed and written to a
+    temporary file at :py:meth:`commit`. :py:meth:`reset` loads them back
+    when their layer becomes one of the most recent ones again. In between,
+    they are available as :py:class:`SpilledLayer` mappings, which load them
+    on each access.
+
+    >>> from wardrobe import TieredStackedDict
+    >>> s = TieredStackedDict(log='')
+    >>> s.hot_depth = 2
+    >>> for word in ['a', 'few', 'words']:
+    ...     s.commit()['log'] += ' ' + word
+    >>> [type(layer).__name__ for layer in s._overriden]
+    ['dict', 'dict', 'SpilledLayer']
+    >>> s.reset().reset().reset()['log']
+    ''
+
+    Spilled items come back as copies, so only layers whose keys and values
+    are immutable builtins are spilled: None, booleans, numbers, strings,
+    and tuples or frozensets of them. Layers with other keys or values, e.g.
+    lists or instances, stay in memory, so that reset() restores the very
+    objects that were overriden.
+
+    >>> shared = {'debug': False}
+    >>> s = TieredStackedDict(cfg=shared)
+    >>> s.hot_depth = 1
+    >>> s.commit()['cfg'] = {'debug': True}
+    >>> s.commit().commit()['cfg'] = None
+    >>> s.reset().reset().reset()['cfg'] is shared
+    True
+    >>> class Key(object):
+    ...     pass
+    >>> key = Key()
+    >>> s = TieredStackedDict({key: 1})
+    >>> s.hot_depth = 1
+    >>> s.commit()[key] = 2
+    >>> s.commit().commit()[key] = 3
+    >>> dict(s.reset().reset().reset()) == {key: 1}
+    True
+
+    Even for immutable values, identity is not preserved. The file is
+    released along with the instance.
+
+    """
+    #: Number of layers kept in memory. At least 1.
+    hot_depth = 8
+
+    #: zlib compression level.
+    compression_level = 6
+
+    def __init__(self, initial=None, **kwargs):
+        super(TieredStackedDict, self).__init__(initial, **kwargs)
+        self._spill_file = None
+
+    def __copy__(self):
+        """Copy operator. The copy spills layers to its own file."""
+        duplicate = super(TieredStackedDict, self).__copy__()
+        duplicate._spill_file = None
+        duplicate._overriden = deque(
+            layer.load() if isinstance(layer, SpilledLayer) else layer
+            for layer in self._overriden)
+        for index in range(self.hot_depth, len(duplicate._overriden)):
+            duplicate._spill(index)
+        return duplicate
+
+    def _spill(self, index):
+        """Write backups of layer at index to file, if their keys and values
+        are immutable, and can be pickled."""
+        layer = self._overriden[index]
+        if not layer or isinstance(layer, SpilledLayer) \
+           or not all(_immutable(key) and _immutable(value)
+                      for key, value in layer.iteritems()):
+            return
+        try:
+            data = cPickle.dumps(layer, cPickle.HIGHEST_PROTOCOL)
+        except (cPickle.PicklingError, TypeError, RuntimeError):
+            return  # E.g. nested too deeply.
+        data = zlib.compress(data, self.compression_level)
+        if self._spill_file is None:
+            self._spill_file = TemporaryFile()
+        spill_file = self._spill_file
+        spill_file.seek(0, 2)
+        offset = spill_file.tell()
+        spill_file.write(data)
+        self._overriden[index] = SpilledLayer(spill_file, offset, len(data),
+                                              len(layer))
+
+    def _unspill(self, index):
+        """Load backups of layer at index from file, if spilled."""
+        layer = self._overriden[index]
+        if not isinstance(layer, SpilledLayer):
+            return
+        self._overriden[index] = layer.load()
+        spill_file = self._spill_file
+        spill_file.seek(0, 2)
+        if spill_file.tell() == layer.offset + layer.size:
+            spill_file.truncate(layer.offset)
+
+    def commit(self):
+        super(TieredStackedDict, self).commit()
+        if len(self._overriden) > self.hot_depth:
+            self._spill(self.hot_depth)
+        return self
+
+    def reset(self, redo=False):
+        if self._has_layers():
+            self._unspill(0)
+        super(TieredStackedDict, self).reset(redo)
+        if len(self._overriden) >= self.hot_depth:
+            self._unspill(self.hot_depth - 1)
+        return self
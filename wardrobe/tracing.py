@@ -0,0 +1,84 @@
+"""Tracing of StackedDict layer operations, as Chrome trace events."""
+import json
+import os
+from thread import get_ident
+from threading import Lock
+import time
+
+
+class TraceWriter(object):
+    """Tracer which writes spans to a file in Chrome trace event format.
+
+    Set it as :py:attr:`wardrobe.stackeddict.StackedDict.tracer` to trace
+    :py:meth:`~wardrobe.stackeddict.StackedDict.commit`,
+    :py:meth:`~wardrobe.stackeddict.StackedDict.reset`,
+    :py:meth:`~wardrobe.stackeddict.StackedDict.clear` and
+    :py:meth:`~wardrobe.stackeddict.StackedDict.update`. Each span records
+    the depth after the operation and the number of entries it processed.
+    Reset the attribute to ``None`` to stop tracing: then the cost is one
+    attribute lookup per operation.
+
+    >>> import json, os, tempfile
+    >>> from wardrobe import StackedDict
+    >>> from wardrobe.tracing import TraceWriter
+    >>> path = os.path.join(tempfile.mkdtemp(), 'trace.json')
+    >>> StackedDict.tracer = TraceWriter(path)
+    >>> s = StackedDict(a=1)
+    >>> s.commit().update(a='A', b='B')
+    >>> silent = s.reset()
+    >>> StackedDict.tracer.close()
+    >>> StackedDict.tracer = None
+    >>> events = json.load(open(path))
+    >>> [(event['name'], event['args']) for event in events]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [(u'commit', {u'depth': 1, u'entries': 0}),
+     (u'update', {u'depth': 1, u'entries': 2}),
+     (u'reset', {u'depth': 0, u'entries': 2})]
+
+    Events are buffered in memory and written ``buffer_size`` at a time. The
+    file can be loaded in ``chrome://tracing`` or compatible viewers. It is
+    valid JSON once :py:meth:`close` has been called.
+
+    """
+    #: Time function, in seconds.
+    clock = staticmethod(time.time)
+
+    def __init__(self, path, buffer_size=1000):
+        self.buffer_size = buffer_size
+        self._events = []
+        self._lock = Lock()
+        self._pid = os.getpid()
+        self._file = open(path, 'w')
+        self._file.write('[')
+        self._separator = '\n'
+
+    def span(self, name, start, depth, entries):
+        """Record span of operation ``name`` which started at ``start``, as
+        returned by :py:meth:`clock`, and ends now."""
+        end = self.clock()
+        self._events.append({'name': name,
+                             'cat': 'wardrobe',
+                             'ph': 'X',
+                             'ts': start * 1000000,
+                             'dur': (end - start) * 1000000,
+                             'pid': self._pid,
+                             'tid': get_ident(),
+                             'args': {'depth': depth, 'entries': entries}})
+        if len(self._events) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered events to file."""
+        with self._lock:
+            events, self._events = self._events, []
+            for event in events:
+                self._file.write(self._separator)
+                self._file.write(json.dumps(event))
+                self._separator = ',\n'
+            self._file.flush()
+
+    def close(self):
+        """Write buffered events and close file."""
+        self.flush()
+        self._file.write('\n]\n')
+        self._file.close()
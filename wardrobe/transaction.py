@@ -0,0 +1,299 @@
+"""StackedDict variant shared by threads, with optimistic transactions."""
+from collections import MutableMapping
+from threading import RLock
+
+from wardrobe.observable import MISSING, ObservableStackedDict
+
+
+#: Marker for keys deleted in a transaction, or missing when read.
+_DELETED = object()
+
+
+class ConflictException(Exception):
+    """Exception raised when a transaction read keys which have been changed
+    since."""
+
+
+class TransactionalStackedDict(ObservableStackedDict):
+    """StackedDict which threads update through optimistic transactions.
+
+    Each change of an item, including those made by :py:meth:`reset`, gives
+    the key a new version number. A :py:class:`Transaction` records versions
+    of the keys it reads and buffers its writes. At commit, writes are applied
+    atomically if no key read has changed in the meantime. Otherwise
+    :py:class:`ConflictException` is raised, and nothing is written.
+
+    >>> from wardrobe import TransactionalStackedDict
+    >>> s = TransactionalStackedDict(balance=100, withdrawn=0)
+    >>> def withdraw(transaction, amount):
+    ...     transaction['balance'] -= amount
+    ...     transaction['withdrawn'] += amount
+    ...     return transaction['balance']
+    >>> s.atomically(withdraw, 30)
+    70
+    >>> dict(s) == {'balance': 70, 'withdrawn': 30}
+    True
+
+    :py:meth:`atomically` retries the function in a new transaction after a
+    conflict, up to :py:attr:`max_retries` times.
+
+    >>> t = s.transaction()
+    >>> t['balance'] += 10
+    >>> s['balance'] = 0  # Concurrent write.
+    >>> t.commit()
+    Traceback (most recent call last):
+    ...
+    ConflictException: ['balance']
+    >>> s['balance']
+    0
+
+    Direct writes and layer operations on the dictionary hold :py:attr:`lock`,
+    so they are atomic too. Readers which don't need a consistent view of
+    several keys can read the dictionary directly.
+
+    Versions are only kept for keys in the dictionary: deleting a key drops
+    its version, so that versions don't grow with the keys ever written.
+    Transactions compare missing keys as missing, whatever their history.
+
+    >>> t = s.transaction()
+    >>> sorted(t)
+    ['balance', 'withdrawn']
+    >>> s['fee'] = 1
+    >>> del s['fee']
+    >>> t.commit()
+    >>> t = s.transaction()
+    >>> sorted(t)
+    ['balance', 'withdrawn']
+    >>> del s['withdrawn']
+    >>> t.commit()
+    Traceback (most recent call last):
+    ...
+    ConflictException: ['withdrawn']
+
+    """
+    #: Number of retries of :py:meth:`atomically` after conflicts. ``None``
+    #: means retry forever.
+    max_retries = None
+
+    def __init__(self, initial=None, **kwargs):
+        super(TransactionalStackedDict, self).__init__(initial, **kwargs)
+        #: Reentrant lock held while changing the dictionary.
+        self.lock = RLock()
+        self._version = 0  # Incremented on each change.
+        self._versions = {}  # Version of last change, for each changed key
+                             # in the dictionary.
+
+    def __copy__(self):
+        """Copy operator. The copy has its own lock and versions."""
+        duplicate = super(TransactionalStackedDict, self).__copy__()
+        duplicate.lock = RLock()
+        duplicate._version = 0
+        duplicate._versions = {}
+        return duplicate
+
+    def _changed(self, key, old_value, new_value):
+        self._version += 1
+        if new_value is MISSING:
+            self._versions.pop(key, None)
+        else:
+            self._versions[key] = self._version
+        super(TransactionalStackedDict, self)._changed(key, old_value,
+                                                       new_value)
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            super(TransactionalStackedDict, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self.lock:
+            super(TransactionalStackedDict, self).__delitem__(key)
+
+    def clear(self):
+        with self.lock:
+            super(TransactionalStackedDict, self).clear()
+
+    def pop(self, key, *args):
+        with self.lock:
+            return super(TransactionalStackedDict, self).pop(key, *args)
+
+    def popitem(self):
+        with self.lock:
+            return super(TransactionalStackedDict, self).popitem()
+
+    def update(self, *args, **kwargs):
+        with self.lock:
+            super(TransactionalStackedDict, self).update(*args, **kwargs)
+
+    def commit(self):
+        with self.lock:
+            return super(TransactionalStackedDict, self).commit()
+
+    def reset(self, redo=False):
+        with self.lock:
+            return super(TransactionalStackedDict, self).reset(redo)
+
+    def redo(self):
+        with self.lock:
+            return super(TransactionalStackedDict, self).redo()
+
+    def _key_version(self, key):
+        """Return version of key, ``None`` if key is missing.
+
+        Must be called with :py:attr:`lock` held.
+
+        """
+        if key in self._dict:
+            return self._versions.get(key, 0)
+        return None
+
+    def transaction(self):
+        """Return a new :py:class:`Transaction` on this dictionary."""
+        return Transaction(self)
+
+    def atomically(self, function, *args, **kwargs):
+        """Call ``function(transaction, *args, **kwargs)`` in a transaction,
+        commit it and return the result.
+
+        The function is called again in a new transaction as long as commit
+        fails, so it should have no side effects besides the transaction.
+        When :py:attr:`max_retries` is exceeded, the last
+        :py:class:`ConflictException` is raised.
+
+        """
+        retries = 0
+        while True:
+            transaction = Transaction(self)
+            result = function(transaction, *args, **kwargs)
+            try:
+                transaction.commit()
+            except ConflictException:
+                if self.max_retries is not None \
+                   and retries >= self.max_retries:
+                    raise
+                retries += 1
+            else:
+                return result
+
+
+class Transaction(MutableMapping):
+    """Private view on a :py:class:`TransactionalStackedDict`, with buffered
+    writes.
+
+    Reads see the transaction's own writes, then the dictionary. They record
+    the version of the keys they read, including missing ones. Iterating over
+    the transaction or taking its length reads all keys: it conflicts with any
+    change of the dictionary.
+
+    >>> from wardrobe import TransactionalStackedDict
+    >>> s = TransactionalStackedDict(a=1, b=2)
+    >>> t = s.transaction()
+    >>> t['c'] = t['a'] + t['b']
+    >>> del t['a']
+    >>> 'c' in s
+    False
+    >>> sorted(t.items())
+    [('b', 2), ('c', 3)]
+    >>> t.commit()
+    >>> sorted(s.items())
+    [('b', 2), ('c', 3)]
+
+    Writes are applied in the current layer of the dictionary, so a
+    :py:meth:`~TransactionalStackedDict.reset` can discard them.
+
+    """
+    def __init__(self, stackeddict):
+        self._stackeddict = stackeddict
+        self._reads = {}  # Version of each key read.
+        self._writes = {}  # New value, or _DELETED, of each key written.
+        self._version = None  # Version of dictionary, if all keys were read.
+        self._all_keys = None  # Keys of dictionary, if all keys were read.
+
+    def _read(self, key):
+        """Return value of key, or _DELETED, and record version."""
+        try:
+            return self._writes[key]
+        except KeyError:
+            pass
+        stackeddict = self._stackeddict
+        with stackeddict.lock:
+            self._reads.setdefault(key, stackeddict._key_version(key))
+            return stackeddict._dict.get(key, _DELETED)
+
+    def __getitem__(self, key):
+        value = self._read(key)
+        if value is _DELETED:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._read(key) is not _DELETED
+
+    def __setitem__(self, key, value):
+        self._writes[key] = value
+
+    def __delitem__(self, key):
+        if self._read(key) is _DELETED:
+            raise KeyError(key)
+        self._writes[key] = _DELETED
+
+    def _keys(self):
+        """Return list of keys, reading them all."""
+        stackeddict = self._stackeddict
+        with stackeddict.lock:
+            keys = set(stackeddict._dict)
+            if self._version is None:
+                self._version = stackeddict._version
+                self._all_keys = frozenset(keys)
+        for key, value in self._writes.iteritems():
+            if value is _DELETED:
+                keys.discard(key)
+            else:
+                keys.add(key)
+        return list(keys)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def conflicts(self):
+        """Return list of keys read which have changed since.
+
+        Must be called with the dictionary's lock held to be reliable.
+
+        """
+        stackeddict = self._stackeddict
+        conflicts = set(key for key, version in self._reads.iteritems()
+                        if stackeddict._key_version(key) != version)
+        if self._version is not None \
+           and self._version != stackeddict._version:
+            # Keys changed since, or deleted since.
+            conflicts.update(key for key, version
+                             in stackeddict._versions.iteritems()
+                             if version > self._version)
+            conflicts.update(key for key in self._all_keys
+                             if key not in stackeddict._dict)
+        return list(conflicts)
+
+    def commit(self):
+        """Apply writes to the dictionary, atomically.
+
+        Raises ConflictException, and writes nothing, if some keys read have
+        changed since. The transaction is empty afterwards.
+
+        """
+        stackeddict = self._stackeddict
+        with stackeddict.lock:
+            conflicts = self.conflicts()
+            if conflicts:
+                raise ConflictException(sorted(conflicts))
+            for key, value in self._writes.iteritems():
+                if value is _DELETED:
+                    stackeddict.pop(key, None)
+                else:
+                    stackeddict[key] = value
+        self._reads = {}
+        self._writes = {}
+        self._version = None
+        self._all_keys = None
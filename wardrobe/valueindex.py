@@ -0,0 +1,85 @@
+"""Secondary indexes on values of ObservableStackedDict instances."""
+from wardrobe.observable import MISSING
+
+
+class ValueIndex(object):
+    """Index of the keys of an ObservableStackedDict, by value.
+
+    Keys are indexed by ``function(value)``, which defaults to the value
+    itself. Results of ``function`` must be hashable.
+
+    The index registers itself as an observer of the dictionary, so it is kept
+    up to date through writes, deletions and :py:meth:`reset`. Queries cost
+    the size of their result.
+
+    >>> from wardrobe import ObservableStackedDict
+    >>> from wardrobe.valueindex import ValueIndex
+    >>> s = ObservableStackedDict(top='blue', bottom='red', cape='red')
+    >>> by_color = ValueIndex(s)
+    >>> by_type = ValueIndex(s, type)
+    >>> sorted(by_color['red'])
+    ['bottom', 'cape']
+    >>> s.commit().update(cape='black', sex_appeal=True)
+    >>> sorted(by_color['red'])
+    ['bottom']
+    >>> sorted(by_type[bool])
+    ['sex_appeal']
+    >>> silent = s.reset()
+    >>> sorted(by_color['red'])
+    ['bottom', 'cape']
+    >>> by_type[bool]
+    set([])
+
+    """
+    def __init__(self, stackeddict, function=None):
+        self._function = function
+        self._keys = {}  # Store set of keys for each indexed value.
+        for key, value in stackeddict.iteritems():
+            self(key, MISSING, value)
+        stackeddict.add_observer(self)
+        self._stackeddict = stackeddict
+
+    def _index_value(self, value):
+        if self._function is None:
+            return value
+        return self._function(value)
+
+    def __call__(self, key, old_value, new_value):
+        """Update index after change of key."""
+        if old_value is not MISSING:
+            index_value = self._index_value(old_value)
+            keys = self._keys[index_value]
+            keys.discard(key)
+            if not keys:
+                del self._keys[index_value]
+        if new_value is not MISSING:
+            index_value = self._index_value(new_value)
+            try:
+                self._keys[index_value].add(key)
+            except KeyError:
+                self._keys[index_value] = set([key])
+
+    def __getitem__(self, index_value):
+        """Return set of keys whose value is indexed as ``index_value``."""
+        return set(self._keys.get(index_value, ()))
+
+    def __contains__(self, index_value):
+        return index_value in self._keys
+
+    def __iter__(self):
+        """Iterate over indexed values."""
+        return iter(self._keys)
+
+    def __len__(self):
+        """Return number of distinct indexed values.
+
+        >>> from wardrobe import ObservableStackedDict
+        >>> len(ValueIndex(ObservableStackedDict(a=1, b=1, c=2)))
+        2
+
+        """
+        return len(self._keys)
+
+    def close(self):
+        """Stop maintaining index."""
+        self._stackeddict.remove_observer(self)